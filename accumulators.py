@@ -0,0 +1,149 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class Moments:
+    """Streaming mean and covariance of a set of fields at fixed points
+
+    Batches of samples are merged into the running state with the
+    pairwise update of Chan et al. (a batched Welford update). The same
+    update combines the states of previous restart segments so
+    everything is computed in a single pass with constant memory per
+    point.
+    """
+
+    def __init__(self, shape, nfields):
+        self.shape = tuple(np.atleast_1d(shape))
+        self.nfields = nfields
+        self.count = 0
+        self.mean = np.zeros(self.shape + (nfields,))
+        self.m2 = np.zeros(self.shape + (nfields, nfields))
+
+    def update(self, samples):
+        """Add (nsamples,) + shape + (nfields,) samples"""
+        samples = np.asarray(samples, dtype=np.float64)
+        n = samples.shape[0]
+        if n == 0:
+            return
+        mean = samples.mean(axis=0)
+        delta = samples - mean
+        m2 = np.einsum("s...i,s...j->...ij", delta, delta)
+        self.merge_state(n, mean, m2)
+
+    def merge_state(self, count, mean, m2):
+        """Merge a partial state (count, mean, m2) into this one"""
+        if count == 0:
+            return
+        if mean.shape != self.mean.shape:
+            raise ValueError(
+                f"Cannot merge moments of shape {mean.shape} into {self.mean.shape}"
+            )
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * (count / total)
+        self.m2 += m2 + np.einsum("...i,...j->...ij", delta, delta) * (
+            self.count * count / total
+        )
+        self.count = total
+
+    def merge(self, other):
+        self.merge_state(other.count, other.mean, other.m2)
+        return self
+
+    @property
+    def covariance(self):
+        """Population covariance (normalized by the number of samples)"""
+        if self.count == 0:
+            return np.zeros(self.m2.shape)
+        return self.m2 / self.count
+
+
+# ========================================================================
+class WeightedMean:
+    """Mean of a set of fields at fixed points with its weight
+
+    The weight is the number of samples averaged so that the means of
+    previous restart segments can be merged.
+    """
+
+    def __init__(self, mean, count=1):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.count = count
+
+    def merge(self, other):
+        if other.mean.shape != self.mean.shape:
+            raise ValueError(
+                f"Cannot merge means of shape {other.mean.shape} into {self.mean.shape}"
+            )
+        total = self.count + other.count
+        if total > 0:
+            self.mean = self.mean + (other.mean - self.mean) * (other.count / total)
+        self.count = total
+        return self
+
+
+# ========================================================================
+class KahanSum:
+    """Running sum with Kahan compensation
+
+    The low order bits lost by each addition are carried in a
+    compensation array so that long sums stored in single precision keep
+    (nearly) the accuracy of a double precision sum.
+    """
+
+    def __init__(self, shape, dtype=np.float64):
+        self.sum = np.zeros(shape, dtype=dtype)
+        self.comp = np.zeros(shape, dtype=dtype)
+
+    def add(self, values, index=slice(None)):
+        """Add values to the sum (or to the rows selected by index)"""
+        y = np.asarray(values, dtype=self.sum.dtype) - self.comp[index]
+        t = self.sum[index] + y
+        self.comp[index] = (t - self.sum[index]) - y
+        self.sum[index] = t
+
+    def __getitem__(self, index):
+        return self.sum[index]
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def save_moments(fname, moments):
+    """Save a dictionary of moments and means (e.g., by plane) to a npz file"""
+    arrays = {}
+    for name, m in moments.items():
+        arrays[f"{name}/count"] = m.count
+        arrays[f"{name}/mean"] = m.mean
+        if isinstance(m, Moments):
+            arrays[f"{name}/m2"] = m.m2
+    np.savez(fname, **arrays)
+
+
+# ========================================================================
+def load_moments(fname):
+    """Load a dictionary of moments saved with save_moments"""
+    moments = {}
+    with np.load(fname) as dat:
+        names = sorted({key.rsplit("/", 1)[0] for key in dat.files})
+        for name in names:
+            count = int(dat[f"{name}/count"])
+            mean = dat[f"{name}/mean"]
+            if f"{name}/m2" in dat.files:
+                m = Moments(mean.shape[:-1], mean.shape[-1])
+                m.merge_state(count, mean, dat[f"{name}/m2"])
+            else:
+                m = WeightedMean(mean, count)
+            moments[name] = m
+    return moments
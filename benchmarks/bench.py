@@ -0,0 +1,179 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import argparse
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+import scipy
+from scipy.interpolate import griddata
+from mpi4py import MPI
+import synthetic
+
+# the post-processing modules run on the stand-in mesh
+sys.modules["stk"] = synthetic
+import utilities
+import layout
+import interpolation
+import parallel
+import datafiles
+import pp
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def timeit(fun, repeat):
+    """Wall times (s) of repeated calls of fun"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "mean": sum(times) / len(times), "repeat": repeat}
+
+
+# ========================================================================
+def run_case(mesh, repeat, plane=3, ninterp=200, dx=0.05 * 4):
+    """Time the post-processing hot paths on a mesh"""
+    res = {}
+    sel = mesh.meta.get_part("interior-hex") & mesh.meta.locally_owned_part
+    wsel = mesh.meta.get_part("wall") & mesh.meta.locally_owned_part
+
+    # Bucket assembly
+    res["bucket_layout"] = timeit(lambda: layout.BucketLayout(mesh, sel), repeat)
+    interior = layout.BucketLayout(mesh, sel)
+    fields, _, ncomps = pp.interior_fields(mesh, False)
+    buf = interior.empty(sum(ncomps))
+    res["bucket_gather"] = timeit(
+        lambda: interior.gather(fields, ncomps, out=buf), repeat
+    )
+
+    # Slab selection
+    xplanes = utilities.xplanes()
+    res["slab_index"] = timeit(
+        lambda: layout.SlabIndex(interior.coords[:, 0], xplanes, dx), repeat
+    )
+    slab = layout.SlabIndex(interior.coords[:, 0], xplanes, dx)[plane]
+
+    # Interpolation on a plane
+    xyz = interior.coords[slab, :]
+    ymin, ymax = utilities.hill(xplanes[plane]), xyz[:, 1].max()
+    yi = np.linspace(ymin, ymax, ninterp)
+    targets = np.column_stack((xplanes[plane] * np.ones(yi.shape), yi))
+    vals = pp.average_fields(buf[slab, :], ncomps, False)
+    uxy, uvals = interpolation.average_points(xyz[:, :2], vals)
+    res["griddata_cubic"] = timeit(
+        lambda: griddata(uxy, uvals, targets, method="cubic", fill_value=0.0),
+        repeat,
+    )
+    res["plane_interpolator_cubic"] = timeit(
+        lambda: interpolation.PlaneInterpolator(uxy, targets)(uvals), repeat
+    )
+    res["interp_weights"] = timeit(
+        lambda: interpolation.PlaneInterpolator(uxy, targets, "linear"), repeat
+    )
+    interp = interpolation.SliceInterpolator(xyz, targets)
+    res["slice_interpolator"] = timeit(lambda: interp(buf[slab, :2]), repeat)
+
+    # Group by reductions of the wall data
+    wall = layout.BucketLayout(mesh, wsel)
+    tw_fields, _, tw_ncomps = pp.wall_fields(mesh)
+    tw = np.hstack((wall.coords, wall.gather(tw_fields, tw_ncomps)))
+    res["group_reduce"] = timeit(
+        lambda: parallel.group_reduce(MPI.COMM_SELF, tw[:, 0], tw), repeat
+    )
+    res["pandas_groupby"] = timeit(
+        lambda: pd.DataFrame(tw).groupby(0, as_index=False).mean(), repeat
+    )
+
+    # Table I/O of the slab fields
+    df = pd.DataFrame(np.hstack((xyz, vals)), columns=["x", "y", "z"] + pp.field_names)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        base = os.path.join(tmpdir, "table")
+        for fmt in datafiles.extensions:
+            res[f"{fmt}_write"] = timeit(
+                lambda: datafiles.write_table(df, base, fmt), repeat
+            )
+            res[f"{fmt}_read"] = timeit(lambda: datafiles.read_table(base), repeat)
+            os.remove(datafiles.table_file(base))
+
+    return res
+
+
+# ========================================================================
+#
+# Main
+#
+# ========================================================================
+if __name__ == "__main__":
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(
+        description="Benchmark the post-processing on synthetic meshes"
+    )
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        nargs="+",
+        help="Mesh sizes (nx x ny x nz)",
+        default=["128x64x1", "128x64x10", "128x64x100"],
+    )
+    parser.add_argument(
+        "-r", "--repeat", help="Number of repetitions", type=int, default=3
+    )
+    parser.add_argument(
+        "--profile",
+        help="Use the mesh wall profile instead of the hill function",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-o", "--output", help="Output file", type=str, default="benchmarks.json"
+    )
+    args = parser.parse_args()
+
+    profile = None
+    if args.profile:
+        profile = synthetic.wall_profile(
+            os.path.join(
+                os.path.dirname(os.path.abspath(__file__)),
+                "..",
+                "meshes",
+                "periodicHill.dat",
+            )
+        )
+
+    cases = []
+    for size in args.sizes:
+        nx, ny, nz = [int(n) for n in size.split("x")]
+        mesh = synthetic.hill_mesh(nx, ny, nz, profile=profile)
+        print(f"Benchmarking {size} ({mesh.nnodes} nodes)")
+        timings = run_case(mesh, args.repeat)
+        for name, t in timings.items():
+            print(f"    {name:30s} {t['min']:.4f} s")
+        cases.append(
+            {"nx": nx, "ny": ny, "nz": nz, "nnodes": mesh.nnodes, "timings": timings}
+        )
+
+    res = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+        },
+        "profile": "mesh" if args.profile else "hill",
+        "cases": cases,
+    }
+    with open(args.output, "w") as f:
+        json.dump(res, f, indent=2)
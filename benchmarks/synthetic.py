@@ -0,0 +1,202 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import geometry
+import utilities
+
+
+# ========================================================================
+#
+# Some defaults variables
+#
+# ========================================================================
+ly = 3.036
+lz = 4.5
+bucket_capacity = 512
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def wall_profile(fname):
+    """Lower wall over one period from the (half hill) mesh profile"""
+    dat = np.loadtxt(fname, skiprows=1)
+    x = np.concatenate((dat[:, 0], geometry.length - dat[::-1, 0]))
+    y = np.concatenate((dat[:, 1], dat[::-1, 1]))
+    return x, y
+
+
+# ========================================================================
+def hill_mesh(nx, ny, nz, profile=None, ntimes=10, seed=0):
+    """Synthetic periodic hill node cloud with the fields read by pp.py
+
+    The nodes are on a structured grid between the lower wall (the hill
+    or the given (x, y) profile) and the top wall. The field values are
+    random.
+    """
+    x = np.linspace(0.0, geometry.length, nx)
+    ywall = utilities.hill(x) if profile is None else np.interp(x, *profile)
+    eta = np.linspace(0.0, 1.0, ny)
+    z = np.linspace(0.0, lz, nz)
+
+    xx = np.broadcast_to(x[None, None, :], (nz, ny, nx))
+    yy = ywall[None, None, :] + eta[None, :, None] * (ly - ywall[None, None, :])
+    yy = np.broadcast_to(yy, (nz, ny, nx))
+    zz = np.broadcast_to(z[:, None, None], (nz, ny, nx))
+    jj = np.broadcast_to(np.arange(ny)[None, :, None], (nz, ny, nx))
+    coords = np.column_stack([a.reshape(-1) for a in (xx, yy, zz)])
+
+    mesh = StkMesh(ntimes)
+    mesh.add_nodes(coords, jj.reshape(-1), ny)
+
+    rng = np.random.default_rng(seed)
+    fields = {
+        "velocity": 3,
+        "turbulent_ke": 1,
+        "specific_dissipation_rate": 1,
+        "dudx": 9,
+        "turbulent_viscosity": 1,
+        "density": 1,
+        "tau_wall": 1,
+        "tau_wall_vector": 3,
+    }
+    for name, ncomp in fields.items():
+        mesh.meta.add_field(name, rng.random((mesh.nnodes, ncomp)))
+
+    return mesh
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class StkRank:
+    NODE_RANK = 0
+
+
+# ========================================================================
+class Part:
+    def __init__(self, name):
+        self.name = name
+
+    def __and__(self, other):
+        return Selector([self]) & other
+
+
+# ========================================================================
+class Selector:
+    """Intersection of parts"""
+
+    def __init__(self, parts):
+        self.parts = frozenset(parts)
+
+    def __and__(self, other):
+        parts = other.parts if isinstance(other, Selector) else [other]
+        return Selector(self.parts | set(parts))
+
+
+# ========================================================================
+class Bucket:
+    def __init__(self, lo, hi, parts):
+        self.lo = lo
+        self.hi = hi
+        self.size = hi - lo
+        self.parts = parts
+
+
+# ========================================================================
+class Field:
+    """Node field stored bucket by bucket (contiguous node ranges)"""
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.is_null = data is None
+
+    def bkt_view(self, bkt):
+        view = self.data[bkt.lo : bkt.hi]
+        return view[:, 0] if view.shape[1] == 1 else view
+
+
+# ========================================================================
+class MetaData:
+    def __init__(self):
+        self.parts = {}
+        self.fields = {}
+        self.locally_owned_part = Part("locally_owned")
+
+    def get_part(self, name):
+        return self.parts.setdefault(name, Part(name))
+
+    def add_field(self, name, data):
+        self.fields[name] = Field(name, data)
+        return self.fields[name]
+
+    def get_field(self, name):
+        return self.fields.get(name, Field(name, None))
+
+    @property
+    def coordinate_field(self):
+        return self.fields["coordinates"]
+
+
+# ========================================================================
+class StkIo:
+    def __init__(self, ntimes):
+        self.time_steps = list(np.linspace(0.0, 1.0, ntimes))
+        self.num_time_steps = ntimes
+        self.max_time = self.time_steps[-1]
+
+    def read_defined_input_fields(self, tstep):
+        return tstep, []
+
+
+# ========================================================================
+class StkMesh:
+    """Stand-in for the bucket and field API of stk.StkMesh
+
+    The nodes are stored in buckets of at most bucket_capacity nodes
+    sharing the same parts, like STK, and field data is contiguous
+    within a bucket so that bkt_view returns a view.
+    """
+
+    def __init__(self, ntimes=10):
+        self.meta = MetaData()
+        self.stkio = StkIo(ntimes)
+        self.bkts = []
+        self.nnodes = 0
+
+    def add_nodes(self, coords, jj, ny):
+        """Add the nodes of a structured grid (j is the wall normal index)"""
+        interior = self.meta.get_part("interior-hex")
+        owned = self.meta.locally_owned_part
+        groups = [
+            (jj == 0, {interior, owned, self.meta.get_part("wall")}),
+            (jj == ny - 1, {interior, owned, self.meta.get_part("top")}),
+            ((0 < jj) & (jj < ny - 1), {interior, owned}),
+        ]
+        order = []
+        for mask, parts in groups:
+            idx = np.flatnonzero(mask)
+            for lo in range(0, len(idx), bucket_capacity):
+                n = min(bucket_capacity, len(idx) - lo)
+                self.bkts.append(Bucket(self.nnodes, self.nnodes + n, parts))
+                self.nnodes += n
+            order.append(idx)
+
+        self.meta.add_field("coordinates", coords[np.concatenate(order)])
+
+    def iter_buckets(self, sel, rank):
+        for bkt in self.bkts:
+            if sel.parts <= bkt.parts:
+                yield bkt
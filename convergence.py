@@ -0,0 +1,72 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+from mpi4py import MPI
+import utilities
+
+pd = utilities.lazy_import("pandas")
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class Monitor:
+    """Convergence of running averages distributed over the ranks
+
+    After each processed step, the relative change of each averaged
+    quantity, ||mean_n - mean_n-1|| / ||mean_n|| over all ranks, is
+    computed with a single reduction so every rank takes the same
+    decision. The averages have converged once every change has been
+    below tol for patience consecutive steps.
+    """
+
+    def __init__(self, comm, tol=None, patience=3):
+        self.comm = comm
+        self.tol = tol
+        self.patience = patience
+        self.previous = None
+        self.history = []
+
+    def update(self, time, quantities):
+        """Add the running averages {name: local array} after a step
+
+        Returns True if the averages have converged.
+        """
+        names = list(quantities)
+        current = {k: np.asarray(quantities[k], dtype=np.float64) for k in names}
+        sums = np.zeros((len(names), 2))
+        for j, name in enumerate(names):
+            sums[j, 1] = np.sum(current[name] ** 2)
+            if self.previous is not None:
+                sums[j, 0] = np.sum((current[name] - self.previous[name]) ** 2)
+        sums = self.comm.allreduce(sums, op=MPI.SUM)
+        self.previous = {k: v.copy() for k, v in current.items()}
+
+        row = {"t": time, "nsteps": len(self.history) + 1}
+        for j, name in enumerate(names):
+            if len(self.history) == 0:
+                row[name] = np.inf
+            elif sums[j, 1] > 0:
+                row[name] = np.sqrt(sums[j, 0] / sums[j, 1])
+            else:
+                row[name] = np.sqrt(sums[j, 0])
+        self.history.append(row)
+
+        return self.converged(names)
+
+    def converged(self, names):
+        if self.tol is None or len(self.history) < self.patience:
+            return False
+        return all(
+            row[name] < self.tol
+            for row in self.history[-self.patience :]
+            for name in names
+        )
+
+    def table(self):
+        return pd.DataFrame(self.history)
@@ -0,0 +1,146 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import argparse
+import os
+import numpy as np
+import utilities
+
+pd = utilities.lazy_import("pandas")
+
+
+# ========================================================================
+#
+# Some defaults variables
+#
+# ========================================================================
+extensions = {"csv": ".dat", "npy": ".npy"}
+precisions = {"double": np.float64, "single": np.float32}
+# time and coordinates: always stored in double precision
+index_columns = ["t", "x", "y", "z"]
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def table_dtype(df):
+    """Columnar record type: one contiguous array per column"""
+    return np.dtype([(str(c), df[c].dtype, (len(df),)) for c in df.columns])
+
+
+# ========================================================================
+def cast_table(df, dtype=None):
+    """Store the floating point data columns of a table as dtype"""
+    if dtype is None:
+        return df
+    return df.astype(
+        {
+            c: dtype
+            for c in df.columns
+            if df[c].dtype.kind == "f" and c not in index_columns
+        }
+    )
+
+
+# ========================================================================
+def write_table(df, base, fmt="csv", dtype=None):
+    """Write a table to base.dat (csv) or base.npy (binary columnar)
+
+    The binary file is a single record whose fields are the columns so
+    that the standard npy header describes the column names, types and
+    length and every column can be memory mapped contiguously. The
+    floating point data columns are stored as dtype if given.
+    """
+    fname = base + extensions[fmt]
+    df = cast_table(df, dtype)
+    if fmt == "csv":
+        df.to_csv(fname, index=False)
+    else:
+        arr = np.empty(1, dtype=table_dtype(df))
+        for c in df.columns:
+            arr[str(c)][0] = df[c].values
+        # replace the file once written: a killed job leaves the previous one
+        tmp = fname + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, fname)
+    return fname
+
+
+# ========================================================================
+def append_table(df, base, fmt="csv", dtype=None):
+    """Append rows to a table (create it if it does not exist)
+
+    The binary table is rewritten (to a temporary file replacing it).
+    """
+    fname = base + extensions[fmt]
+    if not os.path.exists(fname):
+        return write_table(df, base, fmt, dtype)
+
+    if fmt == "csv":
+        df = cast_table(df, dtype)
+        df.to_csv(fname, mode="a", header=False, index=False)
+        return fname
+
+    return write_table(
+        pd.concat([read_table(base, mmap=False), df], ignore_index=True),
+        base,
+        fmt,
+        dtype,
+    )
+
+
+# ========================================================================
+def table_exists(base):
+    return any(os.path.exists(base + ext) for ext in extensions.values())
+
+
+# ========================================================================
+def table_file(base):
+    """Name of the file holding a table (the newest, binary on ties)"""
+    fnames = [base + extensions[fmt] for fmt in ("npy", "csv")]
+    fnames = [f for f in fnames if os.path.exists(f)]
+    if not fnames:
+        return base + extensions["csv"]
+    return max(fnames, key=lambda f: os.stat(f).st_mtime_ns)
+
+
+# ========================================================================
+def read_table(base, mmap=False):
+    """Read the newest of base.npy and base.dat
+
+    With mmap the columns of the binary file are memory mapped
+    (read-only) instead of being loaded.
+    """
+    fname = table_file(base)
+    if fname.endswith(extensions["npy"]):
+        arr = np.load(fname, mmap_mode="r" if mmap else None)
+        return pd.DataFrame({c: arr[c][0] for c in arr.dtype.names}, copy=not mmap)
+
+    return pd.read_csv(fname)
+
+
+# ========================================================================
+#
+# Main
+#
+# ========================================================================
+if __name__ == "__main__":
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(
+        description="Export binary post-processing tables to csv"
+    )
+    parser.add_argument(
+        "-f", "--fname", nargs="+", help="Files to export", required=True
+    )
+    args = parser.parse_args()
+
+    for fname in args.fname:
+        base, ext = os.path.splitext(fname)
+        print(f"Exporting {fname} to {base + extensions['csv']}")
+        write_table(read_table(base, mmap=True), base, "csv")
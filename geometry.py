@@ -0,0 +1,69 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import functools
+import numpy as np
+
+
+# ========================================================================
+#
+# Some defaults variables
+#
+# ========================================================================
+h = 28.0
+length = 252.0 / h
+
+# Segment breakpoints (in units of xstar = x * h) and the cubic
+# coefficients (c0 + c1 * xstar + c2 * xstar^2 + c3 * xstar^3) of each
+# segment of the hill profile
+breakpoints = np.array([0.0, 9.0, 14.0, 20.0, 30.0, 40.0, 50.0])
+# fmt: off
+coefficients = np.array(
+    [
+        [2.800000000000e01, 0.000000000000e00, 6.775070969851e-03, -2.124527775800e-03],
+        [2.507355893131e01, 9.754803562315e-01, -1.016116352781e-01, 1.889794677828e-03],
+        [2.579601052357e01, 8.206693007457e-01, -9.055370274339e-02, 1.626510569859e-03],
+        [4.046435022819e01, -1.379581654948e00, 1.945884504128e-02, -2.070318932190e-04],
+        [1.792461334664e01, 8.743920332081e-01, -5.567361123058e-02, 6.277731764683e-04],
+        [5.639011190988e01, -2.010520359035e00, 1.644919857549e-02, 2.674976141766e-05],
+    ]
+)
+# fmt: on
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def hill(x):
+    """Height of the hill (y / h) at x / h
+
+    All the segments are evaluated in one pass: the segment of each
+    point is found by binary search over the breakpoints and its cubic
+    is evaluated with Horner's rule. The input is not modified.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    xstar = x * h
+    xstar = np.where(xstar > 128, 252 - xstar, xstar)
+
+    seg = np.searchsorted(breakpoints, xstar, side="right") - 1
+    inside = (0 <= seg) & (seg < len(coefficients))
+    c = coefficients[np.clip(seg, 0, len(coefficients) - 1)]
+    ystar = c[..., 0] + xstar * (c[..., 1] + xstar * (c[..., 2] + xstar * c[..., 3]))
+
+    # the first and last segments are clipped to the channel height and floor
+    ystar = np.where(seg == 0, np.minimum(ystar, h), ystar)
+    ystar = np.where(seg == len(coefficients) - 1, np.maximum(ystar, 0.0), ystar)
+    ystar = np.where(inside, ystar, 0.0)
+
+    return ystar / h
+
+
+# ========================================================================
+@functools.lru_cache(maxsize=None)
+def hill_at(x):
+    """Memoized height of the hill at a single (e.g., plane) position"""
+    return float(hill(float(x)))
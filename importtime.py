@@ -0,0 +1,80 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import argparse
+import os
+import sys
+import subprocess
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def import_times(module, cwd):
+    """Cumulative import times (s) of a module and of its direct imports"""
+    cmd = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    proc = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Could not import {module}:\n{proc.stderr}")
+
+    # children are reported before their parent, two spaces deeper
+    times, children = {}, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children[name.strip()] = int(cumulative) * 1e-6
+        elif depth == 0:
+            if name.strip() == module:
+                times = dict(children, **{module: int(cumulative) * 1e-6})
+            children = {}
+    return times
+
+
+# ========================================================================
+#
+# Main
+#
+# ========================================================================
+if __name__ == "__main__":
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(
+        description="Report the import time of the post-processing scripts"
+    )
+    parser.add_argument(
+        "-m",
+        "--modules",
+        nargs="+",
+        help="Modules to check",
+        default=["pp", "pp_part", "datafiles", "interpolation"],
+    )
+    parser.add_argument(
+        "-b", "--budget", help="Import time budget (s)", type=float, default=None
+    )
+    parser.add_argument(
+        "-n", "--ntop", help="Number of imports to report", type=int, default=5
+    )
+    args = parser.parse_args()
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    over = False
+    for module in args.modules:
+        times = import_times(module, cwd)
+        total = times[module]
+        print(f"{module}: {total:.3f} s")
+        heaviest = sorted(times.items(), key=lambda x: x[1], reverse=True)
+        for name, t in [x for x in heaviest if x[0] != module][: args.ntop]:
+            print(f"    {name:30s} {t:.3f} s")
+
+        if args.budget is not None and total > args.budget:
+            print(f"    over the budget of {args.budget:.3f} s")
+            over = True
+
+    sys.exit(1 if over else 0)
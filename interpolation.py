@@ -0,0 +1,190 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+import utilities
+
+scipy_spatial = utilities.lazy_import("scipy.spatial")
+scipy_interpolate = utilities.lazy_import("scipy.interpolate")
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def interp_weights(tri, uvw):
+    """Find the interpolation weights
+
+    See: https://stackoverflow.com/questions/20915502/speedup-scipy-griddata-for-multiple-interpolations-between-two-irregular-grids
+    """
+    d = tri.ndim
+    simplex = tri.find_simplex(uvw)
+    vertices = np.take(tri.simplices, simplex, axis=0)
+    temp = np.take(tri.transform, simplex, axis=0)
+    delta = uvw - temp[:, d]
+    bary = np.einsum("njk,nk->nj", temp[:, :d, :], delta)
+    wts = np.hstack((bary, 1 - bary.sum(axis=1, keepdims=True)))
+    wts[simplex < 0, :] = 0.0
+    return vertices, wts, simplex < 0
+
+
+# ========================================================================
+def interpolate(values, vtx, wts):
+    """Apply interpolation weights to (npts,) or (npts, nfields) values"""
+    return np.einsum("nj,nj...->n...", wts, np.take(values, vtx, axis=0))
+
+
+# ========================================================================
+def unique_points(xy):
+    """Unique (x, y) points and the map from each input row to them"""
+    uxy, inverse = np.unique(xy, axis=0, return_inverse=True)
+    return uxy, inverse.reshape(-1)
+
+
+# ========================================================================
+def average_points(xy, values):
+    """Average (npts, nfields) values sharing the same (x, y) point"""
+    uxy, inverse = unique_points(xy)
+    sums = np.zeros((uxy.shape[0], values.shape[1]))
+    cnt = np.zeros(uxy.shape[0])
+    np.add.at(sums, inverse, values)
+    np.add.at(cnt, inverse, 1)
+    return uxy, sums / cnt[:, None]
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class PlaneInterpolator:
+    """Interpolate scattered plane data onto fixed target points
+
+    The Delaunay triangulation of the source points (and, for linear
+    interpolation, the barycentric weights of the targets) is built once
+    and reused for every field and time step. Values are passed as
+    (npts,) or (npts, nfields) arrays so that all fields are
+    interpolated in one batched call. The cubic method is the same
+    Clough-Tocher scheme used by ``griddata(method="cubic")``.
+    """
+
+    def __init__(self, points, targets, method="cubic", fill_value=0.0):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.targets = np.asarray(targets, dtype=np.float64)
+        self.method = method
+        self.fill_value = fill_value
+        self.tri = scipy_spatial.Delaunay(self.points)
+        if method == "linear":
+            self.vtx, self.wts, self.outside = interp_weights(self.tri, self.targets)
+        elif method != "cubic":
+            raise ValueError(f"Unknown interpolation method: {method}")
+
+    @property
+    def npoints(self):
+        return self.points.shape[0]
+
+    def __call__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if self.method == "linear":
+            res = interpolate(values, self.vtx, self.wts)
+            res[self.outside, ...] = self.fill_value
+            return res
+
+        return scipy_interpolate.CloughTocher2DInterpolator(
+            self.tri, values, fill_value=self.fill_value
+        )(self.targets)
+
+
+# ========================================================================
+class SliceInterpolator:
+    """Interpolate every spanwise slice of a plane with one triangulation
+
+    The extruded mesh has the same (x, y) points in every z slice so the
+    slices are scattered onto the unique (x, y) points of the plane and
+    interpolated together. Slices that do not cover all the unique points
+    fall back to their own triangulation.
+    """
+
+    def __init__(self, xyz, targets, method="cubic", fill_value=0.0):
+        self.xyz = xyz
+        uxy, inverse = unique_points(xyz[:, :2])
+        self.targets = targets
+        self.method = method
+        self.fill_value = fill_value
+        self.inverse = inverse
+        self.interp = PlaneInterpolator(uxy, targets, method, fill_value)
+
+        zs, self.zidx = np.unique(xyz[:, 2], return_inverse=True)
+        self.nslices = len(zs)
+        counts = np.zeros((self.nslices, uxy.shape[0]), dtype=np.int64)
+        np.add.at(counts, (self.zidx, inverse), 1)
+        self.complete = np.all(counts == 1, axis=1)
+
+    def __call__(self, values):
+        """Interpolate (npts, nfields) values, returns (nslices, ntargets, nfields)"""
+        values = np.asarray(values, dtype=np.float64)
+        nfields = values.shape[1]
+        res = np.empty((self.nslices, len(self.targets), nfields))
+
+        full = np.flatnonzero(self.complete)
+        if len(full) > 0:
+            rows = np.isin(self.zidx, full)
+            slot = np.searchsorted(full, self.zidx[rows])
+            scattered = np.zeros((self.interp.npoints, len(full), nfields))
+            scattered[self.inverse[rows], slot, :] = values[rows, :]
+            res[full] = np.moveaxis(
+                self.interp(scattered.reshape(self.interp.npoints, -1)).reshape(
+                    len(self.targets), len(full), nfields
+                ),
+                1,
+                0,
+            )
+
+        for k in np.flatnonzero(~self.complete):
+            rows = self.zidx == k
+            uxy, vals = average_points(
+                self.interp.points[self.inverse[rows]], values[rows, :]
+            )
+            res[k] = PlaneInterpolator(uxy, self.targets, self.method, self.fill_value)(
+                vals
+            )
+
+        return res
+
+    def average(self, values):
+        """Interpolate the average over the slices of (npts, nfields) values"""
+        values = np.asarray(values, dtype=np.float64)
+        sums = np.zeros((self.interp.npoints, values.shape[1]))
+        cnt = np.zeros(self.interp.npoints)
+        np.add.at(sums, self.inverse, values)
+        np.add.at(cnt, self.inverse, 1)
+        return self.interp(sums / cnt[:, None])
+
+
+# ========================================================================
+class GridRasterizer:
+    """Linear interpolation of scattered plane data onto a uniform grid
+
+    The triangulation and the barycentric weights of the grid points are
+    computed once so that rasterizing each additional field is a gather
+    and a weighted sum. Grid points outside of the data are NaN.
+    """
+
+    def __init__(self, points, extent, shape):
+        self.extent = extent
+        self.shape = shape
+        xmin, xmax, ymin, ymax = extent
+        ny, nx = shape
+        xg, yg = np.meshgrid(np.linspace(xmin, xmax, nx), np.linspace(ymin, ymax, ny))
+        self.interp = PlaneInterpolator(
+            points,
+            np.column_stack((xg.ravel(), yg.ravel())),
+            method="linear",
+            fill_value=np.nan,
+        )
+
+    def __call__(self, values):
+        return self.interp(values).reshape(self.shape)
@@ -0,0 +1,137 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+import stk
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def column_slices(ncomps):
+    """Column slices of fields with ncomps components stacked side by side"""
+    offsets = np.concatenate(([0], np.cumsum(ncomps)))
+    return [slice(lo, hi) for lo, hi in zip(offsets[:-1], offsets[1:])]
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class BucketLayout:
+    """Node layout of the buckets of a selector
+
+    The bucket offsets and node coordinates are computed once per mesh
+    (the buckets do not change when fields are read for a new time step).
+    Field values are then copied from the bucket views straight into
+    preallocated, column contiguous, buffers.
+    """
+
+    def __init__(self, mesh, sel):
+        self.mesh = mesh
+        self.sel = sel
+        sizes = [bkt.size for bkt in self.buckets()]
+        self.offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        self.nnodes = int(self.offsets[-1])
+        self.coords = self.gather([mesh.meta.coordinate_field], [3])
+
+    def buckets(self):
+        return self.mesh.iter_buckets(self.sel, stk.StkRank.NODE_RANK)
+
+    def empty(self, ncols, dtype=np.float64):
+        """Allocate a buffer for ncols columns of node data"""
+        return np.empty((self.nnodes, ncols), dtype=dtype, order="F")
+
+    def gather(self, fields, ncomps, out=None):
+        """Copy the values of the fields into (nnodes, sum(ncomps)) out"""
+        if out is None:
+            out = self.empty(sum(ncomps))
+        slices = column_slices(ncomps)
+        for bkt, lo, hi in zip(self.buckets(), self.offsets[:-1], self.offsets[1:]):
+            for fld, s in zip(fields, slices):
+                out[lo:hi, s] = fld.bkt_view(bkt).reshape(hi - lo, -1)
+        return out
+
+
+# ========================================================================
+class SlabIndex:
+    """Index of the nodes around a set of x planes
+
+    The nodes are sorted by x once so that each slab [x - dx, x + dx] is
+    a contiguous range of the sorted order found by binary search. The
+    node indices of each slab are kept (in node order) and reused for
+    every field and time step.
+    """
+
+    def __init__(self, x, planes, dx):
+        order = np.argsort(x, kind="stable")
+        xs = x[order]
+        self.slabs = []
+        for xp in planes:
+            lo = np.searchsorted(xs, xp - dx, side="left")
+            hi = np.searchsorted(xs, xp + dx, side="right")
+            self.slabs.append(np.sort(order[lo:hi]))
+
+    def __len__(self):
+        return len(self.slabs)
+
+    def __getitem__(self, k):
+        return self.slabs[k]
+
+
+# ========================================================================
+class RowChunks:
+    """Chunks of a subset of the nodes of a layout
+
+    The rows (node indices in the layout) are sorted and split in chunks
+    of at most chunk_rows rows. Gathering a chunk only visits the buckets
+    holding its rows and copies them to a buffer of the chunk size, so
+    memory is bounded by the chunk size instead of the number of nodes.
+    """
+
+    def __init__(self, layout, rows, chunk_rows=None):
+        self.layout = layout
+        self.rows = np.unique(rows)
+        self.nrows = len(self.rows)
+        self.chunk_rows = max(1, min(chunk_rows or self.nrows, self.nrows))
+        self.bkts = np.searchsorted(layout.offsets, self.rows, side="right") - 1
+        self.chunks = [
+            slice(lo, min(lo + self.chunk_rows, self.nrows))
+            for lo in range(0, self.nrows, self.chunk_rows)
+        ]
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def index(self, nodes):
+        """Positions of nodes (a subset of the rows) in the rows"""
+        return np.searchsorted(self.rows, nodes)
+
+    def empty(self, ncols, dtype=np.float64):
+        """Allocate a buffer for a chunk of ncols columns"""
+        return np.empty((self.chunk_rows, ncols), dtype=dtype, order="F")
+
+    def gather(self, fields, ncomps, out=None):
+        """Yield (chunk slice, values of the rows of the chunk)"""
+        if out is None:
+            out = self.empty(sum(ncomps))
+        slices = column_slices(ncomps)
+        buckets = list(self.layout.buckets())
+        offsets = self.layout.offsets
+        for chunk in self.chunks:
+            rows, bkts = self.rows[chunk], self.bkts[chunk]
+            buf = out[: len(rows)]
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(bkts)) + 1))
+            ends = np.concatenate((starts[1:], [len(rows)]))
+            for lo, hi in zip(starts, ends):
+                b = bkts[lo]
+                bkt, size = buckets[b], offsets[b + 1] - offsets[b]
+                local = rows[lo:hi] - offsets[b]
+                for fld, s in zip(fields, slices):
+                    buf[lo:hi, s] = fld.bkt_view(bkt).reshape(size, -1)[local]
+            yield chunk, buf
@@ -0,0 +1,60 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import os
+import re
+import json
+import hashlib
+import refcache
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class PageCache:
+    """Rendered pages cached on disk and keyed on their input files
+
+    Pages are cached by group (a group is a set of pages built from the
+    same inputs, e.g., the front contour maps of a model). The key of a
+    group is the hash of the plot options, the input file names and their
+    fingerprints so a group is only rendered again when one of its
+    inputs changes.
+    """
+
+    def __init__(self, cache_dir, options):
+        self.cache_dir = cache_dir
+        self.options = options
+        self.manifest_name = os.path.join(cache_dir, "manifest.json")
+        self.manifest = {}
+        if os.path.exists(self.manifest_name):
+            with open(self.manifest_name, "r") as f:
+                self.manifest = json.load(f)
+
+    def key(self, inputs):
+        inputs = sorted(set(os.path.abspath(fname) for fname in inputs))
+        dat = [self.options, inputs, refcache.fingerprint(inputs)]
+        return hashlib.sha1(json.dumps(dat).encode()).hexdigest()
+
+    def fname(self, name):
+        return os.path.join(self.cache_dir, re.sub(r"[^\w\-]", "_", name) + ".pdf")
+
+    def cached(self, group, inputs):
+        """Names of the cached pages of a group (None if out of date)"""
+        entry = self.manifest.get(group)
+        if entry is None or entry["key"] != self.key(inputs):
+            return None
+        if not all(os.path.exists(self.fname(name)) for name in entry["pages"]):
+            return None
+        return entry["pages"]
+
+    def store(self, group, inputs, names):
+        self.manifest[group] = {"key": self.key(inputs), "pages": list(names)}
+
+    def write(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.manifest_name, "w") as f:
+            json.dump(self.manifest, f, indent=2)
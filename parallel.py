@@ -0,0 +1,116 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+from mpi4py import MPI
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def block_owners(nblocks, size, distribute=True):
+    """Owner rank of each block (round-robin or all on rank 0)"""
+    if distribute:
+        return [k % size for k in range(nblocks)]
+    return [0 for k in range(nblocks)]
+
+
+# ========================================================================
+def group_reduce(comm, keys, values, tol=1e-8, root=0):
+    """Mean of the values grouped by quantized keys over all ranks
+
+    Each rank sums its values (and counts them) per key locally. The
+    union of the keys is assembled with an Allgatherv of the unique keys
+    and the sums are combined with a single MPI reduction so only the
+    O(unique keys) reduced profile reaches root. Returns the means, sorted
+    by key, on root and None elsewhere.
+    """
+    rank = comm.Get_rank()
+    # explicit column count: a rank can own no nodes
+    values = np.asarray(values, dtype=np.float64)
+    values = values.reshape(len(keys), values.shape[-1] if values.ndim == 2 else 1)
+    qkeys = np.round(np.asarray(keys) / tol).astype(np.int64)
+    ukeys, inverse = np.unique(qkeys, return_inverse=True)
+
+    nkeys = np.array(comm.allgather(len(ukeys)), dtype=np.int64)
+    all_keys = np.empty(nkeys.sum(), dtype=np.int64)
+    displs = np.concatenate(([0], np.cumsum(nkeys)[:-1]))
+    comm.Allgatherv(ukeys, [all_keys, (nkeys, displs)])
+    gkeys = np.unique(all_keys)
+
+    loc = np.searchsorted(gkeys, ukeys)[inverse.reshape(-1)]
+    sums = np.zeros((len(gkeys), values.shape[1] + 1))
+    np.add.at(sums[:, :-1], loc, values)
+    sums[:, -1] = np.bincount(loc, minlength=len(gkeys))
+
+    res = np.empty(sums.shape) if rank == root else None
+    comm.Reduce(sums, res, op=MPI.SUM, root=root)
+    if rank != root:
+        return None
+    return res[:, :-1] / res[:, -1:]
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class BlockExchange:
+    """Send blocks of node rows to the rank owning each block
+
+    Every rank holds one block of rows per owner-assigned item (e.g., the
+    slab around each plane). The number of rows of each block does not
+    change between calls so the counts and displacements are exchanged
+    once. Each call then moves the contiguous rows of all blocks with a
+    single buffer based Alltoallv.
+    """
+
+    def __init__(self, comm, nrows, owners):
+        self.comm = comm
+        self.rank = comm.Get_rank()
+        self.size = comm.Get_size()
+        self.owners = np.asarray(owners)
+        nrows = np.asarray(nrows, dtype=np.int64)
+        self.counts = np.empty((self.size, len(nrows)), dtype=np.int64)
+        comm.Allgather(nrows, self.counts)
+
+        # send the blocks grouped by owner (stable in block order)
+        self.order = np.argsort(self.owners, kind="stable")
+        self.send_rows = np.bincount(
+            self.owners, weights=nrows, minlength=self.size
+        ).astype(np.int64)
+
+        # receive the owned blocks of each rank, in rank then block order
+        self.owned = [int(k) for k in np.flatnonzero(self.owners == self.rank)]
+        self.recv_rows = self.counts[:, self.owned].sum(axis=1)
+
+    def __call__(self, blocks):
+        """Exchange the blocks, returns {block index: rows from all ranks}"""
+        ncols = blocks[0].shape[1] if blocks[0].ndim > 1 else 1
+        dtype = blocks[0].dtype
+        sendbuf = np.ascontiguousarray(
+            np.concatenate([blocks[k].reshape(-1, ncols) for k in self.order]),
+            dtype=dtype,
+        )
+        recvbuf = np.empty((self.recv_rows.sum(), ncols), dtype=dtype)
+        scounts = self.send_rows * ncols
+        rcounts = self.recv_rows * ncols
+        sdispls = np.concatenate(([0], np.cumsum(scounts)[:-1]))
+        rdispls = np.concatenate(([0], np.cumsum(rcounts)[:-1]))
+        self.comm.Alltoallv(
+            [sendbuf, (scounts, sdispls)], [recvbuf, (rcounts, rdispls)]
+        )
+
+        parts = {k: [] for k in self.owned}
+        cnt = 0
+        for r in range(self.size):
+            for k in self.owned:
+                n = self.counts[r, k]
+                parts[k].append(recvbuf[cnt : cnt + n])
+                cnt += n
+
+        return {k: np.vstack(lst) for k, lst in parts.items()}
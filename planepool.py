@@ -0,0 +1,142 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import interpolation
+
+
+# ========================================================================
+#
+# Some defaults variables
+#
+# ========================================================================
+# interpolators built by a worker process, by geometry block and plane
+_interps = {}
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def read_shared(desc):
+    """Copy of an array stored in a shared memory block"""
+    name, shape, dtype, offset = desc
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.array(np.ndarray(shape, dtype, buffer=shm.buf, offset=offset))
+    finally:
+        shm.close()
+
+
+# ========================================================================
+def interpolate_shared(geometry, k, values, average):
+    """Interpolate the shared values of plane k in a worker process"""
+    key = (geometry[0][0], k)
+    if key not in _interps:
+        xyz, targets = [read_shared(desc) for desc in geometry]
+        _interps[key] = interpolation.SliceInterpolator(xyz, targets)
+    interp = _interps[key]
+    vals = read_shared(values)
+    return interp.average(vals) if average else interp(vals)
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class SharedBlock:
+    """Arrays packed into a single shared memory block"""
+
+    def __init__(self, arrays):
+        arrays = [np.ascontiguousarray(a) for a in arrays]
+        offsets = np.concatenate(([0], np.cumsum([a.nbytes for a in arrays])))
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offsets[-1], 1))
+        self.descs = []
+        for a, offset in zip(arrays, offsets[:-1]):
+            desc = (self.shm.name, a.shape, a.dtype.str, int(offset))
+            np.ndarray(a.shape, a.dtype, buffer=self.shm.buf, offset=offset)[...] = a
+            self.descs.append(desc)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# ========================================================================
+class PlanePool:
+    """Interpolate independent planes in a pool of processes
+
+    planes maps each plane to its (xyz, targets). With more than one
+    worker, the plane geometries are put in shared memory once and each
+    worker builds (and keeps) the interpolators of the planes it is
+    given. The values of each call are packed into one shared block so
+    only the block name and offsets are pickled. The results are
+    returned by plane, so how they are combined does not depend on the
+    scheduling. With one worker, the planes are interpolated in this
+    process.
+    """
+
+    def __init__(self, planes, nworkers=1):
+        self.keys = sorted(planes)
+        self.targets = {k: planes[k][1] for k in self.keys}
+        self.executor = None
+        if nworkers > 1 and len(self.keys) > 1:
+            # fork: the workers must not initialize MPI again
+            self.geometry = SharedBlock([a for k in self.keys for a in planes[k]])
+            self.executor = ProcessPoolExecutor(
+                min(nworkers, len(self.keys)),
+                mp_context=multiprocessing.get_context("fork"),
+            )
+            # start the workers now, before any (reader) thread is running
+            self.executor.submit(int).result()
+        else:
+            self.interps = {
+                k: interpolation.SliceInterpolator(*planes[k]) for k in self.keys
+            }
+
+    def map(self, values, average=False):
+        """Interpolate the values of each plane, returns {plane: result}"""
+        if self.executor is None:
+            return {
+                k: self.interps[k].average(values[k])
+                if average
+                else self.interps[k](values[k])
+                for k in self.keys
+            }
+
+        block = SharedBlock([values[k] for k in self.keys])
+        try:
+            futures = {
+                k: self.executor.submit(
+                    interpolate_shared,
+                    self.geometry.descs[2 * i : 2 * i + 2],
+                    k,
+                    block.descs[i],
+                    average,
+                )
+                for i, k in enumerate(self.keys)
+            }
+            return {k: f.result() for k, f in futures.items()}
+        finally:
+            block.close()
+
+    def __call__(self, values):
+        """Interpolate every spanwise slice of the planes"""
+        return self.map(values)
+
+    def average(self, values):
+        """Interpolate the spanwise average of the planes"""
+        return self.map(values, average=True)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.geometry.close()
+            self.executor = None
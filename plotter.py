@@ -8,6 +8,9 @@
 import argparse
 import os
 import glob
+import functools
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import yaml
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
@@ -15,7 +18,15 @@ from matplotlib.lines import Line2D
 import pandas as pd
 import numpy as np
 import utilities
-from scipy.interpolate import griddata
+import datafiles
+import refcache
+import interpolation
+import pagecache
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
 
 
 # ========================================================================
@@ -140,6 +151,201 @@ def parse_ic(fname):
             print(exc)
 
 
+# ========================================================================
+def read_les_cf_data(fdir):
+    return pd.read_csv(
+        os.path.join(fdir, "hill_LES_cf_digitized.dat"), delim_whitespace=True
+    )
+
+
+# ========================================================================
+def new_page(pages, name, **kwargs):
+    """Add a page (figure) description if it does not exist"""
+    if name not in pages:
+        pages[name] = {
+            "figsize": None,
+            "artists": [],
+            "legend": None,
+            "hill": None,
+            "group": name,
+            "inputs": [os.path.abspath(__file__)],
+        }
+        pages[name].update(kwargs)
+    return pages[name]
+
+
+# ========================================================================
+def add_input(page, *fnames):
+    """Record the files a page is built from"""
+    page["inputs"] += [fname for fname in fnames if fname not in page["inputs"]]
+
+
+# ========================================================================
+def add_artist(page, kind, *args, dashes=None, **kwargs):
+    """Add an artist (plot, fill_between, imshow) to a page description"""
+    args = [np.asarray(a) if isinstance(a, pd.Series) else a for a in args]
+    page["artists"].append((kind, args, kwargs, dashes))
+
+
+# ========================================================================
+def render_page(page):
+    """Draw a page description and return the figure"""
+    fig = plt.figure(figsize=page["figsize"])
+    ax = plt.gca()
+    img = None
+    for kind, args, kwargs, dashes in page["artists"]:
+        p = getattr(plt, kind)(*args, **kwargs)
+        if kind == "imshow":
+            img = p
+        if dashes is not None:
+            p[0].set_dashes(dashes)
+
+    if page["hill"] is not None:
+        x_hill = np.linspace(0, 9, 100)
+        y_hill = utilities.hill(x_hill)
+        plt.fill_between(
+            x_hill,
+            np.zeros(x_hill.shape),
+            y_hill,
+            color="darkgray",
+            zorder=page["hill"],
+        )
+    if img is not None:
+        plt.colorbar(img)
+    plt.xlabel(page["xlabel"], fontsize=22, fontweight="bold")
+    plt.ylabel(page["ylabel"], fontsize=22, fontweight="bold")
+    plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
+    plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
+    if page.get("xlim") is not None:
+        plt.xlim(page["xlim"])
+    if page.get("ylim") is not None:
+        plt.ylim(page["ylim"])
+    if page["legend"] == "labels":
+        ax.legend(loc="best")
+    elif page["legend"] is not None:
+        ax.legend(handles=[Line2D([0], [0], **h) for h in page["legend"]], loc="best")
+    plt.tight_layout()
+    return fig
+
+
+# ========================================================================
+def save_page(page, fname):
+    """Render a page to its own file (used by the worker processes)"""
+    fig = render_page(page)
+    fig.savefig(fname, dpi=300)
+    plt.close(fig)
+    return fname
+
+
+# ========================================================================
+def save_pages(pages, fname, nprocs=1, cache=None):
+    """Render all the pages into a single pdf
+
+    With more than one process, each page is rendered to its own pdf in
+    a process pool and the pages are merged in order. With a page cache,
+    only the pages whose inputs changed are rendered (to the cache) and
+    the cached renders of the other pages are merged with them.
+    """
+    if (nprocs > 1 or cache is not None) and pypdf is None:
+        print("pypdf is not available, rendering all the pages serially")
+        nprocs = 1
+        cache = None
+
+    if cache is None and nprocs <= 1:
+        with PdfPages(fname) as pdf:
+            for page in pages.values():
+                fig = render_page(page)
+                pdf.savefig(fig, dpi=300)
+                plt.close(fig)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if cache is None:
+            fnames = {
+                name: os.path.join(tmpdir, f"page{k:04d}.pdf")
+                for k, name in enumerate(pages)
+            }
+            todo = list(pages)
+        else:
+            os.makedirs(cache.cache_dir, exist_ok=True)
+            fnames = {name: cache.fname(name) for name in pages}
+            groups = {}
+            for name, page in pages.items():
+                groups.setdefault(page["group"], (page["inputs"], []))[1].append(name)
+            fresh = [
+                group
+                for group, (inputs, names) in groups.items()
+                if cache.cached(group, inputs) == names
+            ]
+            todo = [name for name in pages if pages[name]["group"] not in fresh]
+            print(f"Rendering {len(todo)} of {len(pages)} pages")
+
+        if nprocs > 1:
+            with ProcessPoolExecutor(max_workers=nprocs) as executor:
+                list(
+                    executor.map(
+                        save_page,
+                        [pages[name] for name in todo],
+                        [fnames[name] for name in todo],
+                    )
+                )
+        else:
+            for name in todo:
+                save_page(pages[name], fnames[name])
+
+        if cache is not None:
+            for group, (inputs, names) in groups.items():
+                cache.store(group, inputs, names)
+            cache.write()
+
+        writer = pypdf.PdfWriter()
+        for name in pages:
+            writer.append(fnames[name])
+        with open(fname, "wb") as f:
+            writer.write(f)
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class ReferenceData:
+    """Reference datasets, loaded on first access and cached in binary form"""
+
+    def __init__(self, refdir):
+        self.refdir = refdir
+        self.cache_dir = os.path.join(refdir, ".cache")
+        self.sources = {}
+
+    def load(self, name, subdir, pattern, reader):
+        fdir = os.path.join(self.refdir, subdir)
+        self.sources[name] = glob.glob(os.path.join(fdir, pattern))
+        return refcache.cached_table(
+            name, self.sources[name], lambda: reader(fdir), self.cache_dir
+        )
+
+    @functools.cached_property
+    def exp(self):
+        return self.load("exp", "exp", "*.dat", read_exp_data)
+
+    @functools.cached_property
+    def les(self):
+        return self.load("les", "les", "UFR3-30_C_10595_data_MB-*.dat", read_les_data)
+
+    @functools.cached_property
+    def les_cf(self):
+        return self.load("les_cf", "les", "hill_LES_cf_digitized.dat", read_les_cf_data)
+
+    @functools.cached_property
+    def cdp_v2f(self):
+        return self.load("cdp-v2f", "cdp-v2f", "*.csv", read_cdp_data)
+
+    @functools.cached_property
+    def cdp_ams(self):
+        return self.load("cdp-ams", "cdp-ams", "*.csv", read_cdp_data)
+
+
 # ========================================================================
 #
 # Main
@@ -150,29 +356,108 @@ if __name__ == "__main__":
     # Parse arguments
     parser = argparse.ArgumentParser(description="A simple plot tool")
     parser.add_argument("-f", "--fdir", nargs="+", help="Folder to plot", required=True)
+    parser.add_argument(
+        "-n",
+        "--nprocs",
+        help="Number of processes used to render the pages",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--front_dpi",
+        help="Resolution (dots per inch of the figure) of the front contour maps",
+        type=float,
+    )
+    parser.add_argument(
+        "--incremental",
+        help="Only render the pages whose input files changed (cached in .plots)",
+        action="store_true",
+    )
     args = parser.parse_args()
 
     # Reference data
-    refdir = os.path.abspath("refdata")
-    edir = os.path.join(refdir, "exp")
-    ldir = os.path.join(refdir, "les")
-    edf = read_exp_data(edir)
-    ldf = read_les_data(ldir)
-    v2fdf = read_cdp_data(os.path.join(refdir, "cdp-v2f"))
-    amsdf = read_cdp_data(os.path.join(refdir, "cdp-ams"))
+    ref = ReferenceData(os.path.abspath("refdata"))
     figsize = (15, 6)
     vscale = 4.0
     vpscale = 10.0
 
     # plot stuff
     fname = "plots.pdf"
+    cache = None
+    if args.incremental:
+        cache = pagecache.PageCache(
+            os.path.abspath(".plots"),
+            {"fdir": args.fdir, "front_dpi": args.front_dpi},
+        )
     legend_elements = []
+    pages = {}
+    profile = {"figsize": figsize, "hill": 0, "xlim": [-0.5, 9.5], "ylim": [0, 3.5]}
+    new_page(
+        pages,
+        "u",
+        xlabel=r"$\langle u \rangle / u_0 + x/h$",
+        ylabel=r"$y / h$",
+        legend=legend_elements,
+        **profile,
+    )
+    new_page(
+        pages,
+        "v",
+        xlabel=f"${vscale}\\langle v \\rangle / u_0 + x/h$",
+        ylabel=r"$y / h$",
+        legend=legend_elements,
+        **profile,
+    )
+    new_page(
+        pages,
+        "upup",
+        xlabel=f"${vpscale}\\langle u'u' \\rangle / u_0^2 + x/h$",
+        ylabel=r"$y / h$",
+        legend=legend_elements,
+        **profile,
+    )
+    new_page(
+        pages,
+        "vpvp",
+        xlabel=f"${vpscale}\\langle v'v' \\rangle / u_0^2 + x/h$",
+        ylabel=r"$y / h$",
+        legend=legend_elements,
+        **profile,
+    )
+    new_page(
+        pages,
+        "upvp",
+        xlabel=f"${vpscale}\\langle u'v' \\rangle/u_0^2 + x/h$",
+        ylabel=r"$y / h$",
+        legend=legend_elements,
+        **profile,
+    )
+    new_page(pages, "cf", xlabel=r"$x/h$", ylabel=r"$c_f$", legend="labels")
+    new_page(
+        pages,
+        "u_inlet",
+        xlabel=r"$t / \tau$",
+        ylabel=r"$\bar{u} (x=0)$",
+        legend="labels",
+    )
+    new_page(
+        pages,
+        "tke_inlet",
+        xlabel=r"$t / \tau$",
+        ylabel=r"$\bar{k} (x=0)$",
+        legend="labels",
+    )
+    new_page(
+        pages,
+        "sdr_inlet",
+        xlabel=r"$t / \tau$",
+        ylabel=r"$\bar{\omega} (x=0)$",
+        legend="labels",
+    )
 
     # Exp.
     legend_elements += [
-        Line2D(
-            [0],
-            [0],
+        dict(
             lw=0,
             marker=markertype[2],
             color=cmap[-1],
@@ -182,206 +467,184 @@ if __name__ == "__main__":
             label="Exp. (Rapp 2009)",
         ),
     ]
-    grouped = edf.groupby(["x"])
+    marker = dict(
+        lw=0,
+        color=cmap[-1],
+        marker=markertype[2],
+        mec=cmap[-1],
+        mfc=cmap[-1],
+        ms=3,
+    )
+    grouped = ref.exp.groupby(["x"])
     for k, (name, group) in enumerate(grouped):
 
         idx = group.y.values >= utilities.hill(group.x.values)
-        plt.figure("u", figsize=figsize)
-        p = plt.plot(
-            group[idx].u + group[idx].x,
-            group[idx].y,
-            lw=0,
-            color=cmap[-1],
-            marker=markertype[2],
-            mec=cmap[-1],
-            mfc=cmap[-1],
-            ms=3,
+        add_artist(
+            pages["u"], "plot", group[idx].u + group[idx].x, group[idx].y, **marker
         )
-
-        plt.figure("v", figsize=figsize)
-        p = plt.plot(
+        add_artist(
+            pages["v"],
+            "plot",
             vscale * group[idx].v + group[idx].x,
             group[idx].y,
-            lw=0,
-            color=cmap[-1],
-            marker=markertype[2],
-            mec=cmap[-1],
-            mfc=cmap[-1],
-            ms=3,
-        )
-
-        plt.figure("upup", figsize=figsize)
-        p = plt.plot(
-            vpscale * group[idx].upup + group[idx].x,
-            group[idx].y,
-            lw=0,
-            color=cmap[-1],
-            marker=markertype[2],
-            mec=cmap[-1],
-            mfc=cmap[-1],
-            ms=3,
-        )
-
-        plt.figure("vpvp", figsize=figsize)
-        p = plt.plot(
-            vpscale * group[idx].vpvp + group[idx].x,
-            group[idx].y,
-            lw=0,
-            color=cmap[-1],
-            marker=markertype[2],
-            mec=cmap[-1],
-            mfc=cmap[-1],
-            ms=3,
-        )
-
-        plt.figure("upvp", figsize=figsize)
-        p = plt.plot(
-            vpscale * group[idx].upvp + group[idx].x,
-            group[idx].y,
-            lw=0,
-            color=cmap[-1],
-            marker=markertype[2],
-            mec=cmap[-1],
-            mfc=cmap[-1],
-            ms=3,
+            **marker,
         )
+        for fld in ["upup", "vpvp", "upvp"]:
+            add_artist(
+                pages[fld],
+                "plot",
+                vpscale * group[idx][fld] + group[idx].x,
+                group[idx].y,
+                **marker,
+            )
 
     # LES
-    legend_elements += (
-        Line2D([0], [0], lw=2, color=cmap[-2], label="LES (Breuer 2009)"),
-    )
-    grouped = ldf.groupby(["x"])
+    legend_elements += [dict(lw=2, color=cmap[-2], label="LES (Breuer 2009)")]
+    grouped = ref.les.groupby(["x"])
     for k, (name, group) in enumerate(grouped):
 
         idx = group.y.values >= utilities.hill(group.x.values)
-        plt.figure("u")
-        p = plt.plot(group[idx].u + group[idx].x, group[idx].y, lw=2, color=cmap[-2])
-        p[0].set_dashes(dashseq[-1])
-
-        plt.figure("v")
-        p = plt.plot(
-            vscale * group[idx].v + group[idx].x, group[idx].y, lw=2, color=cmap[-2]
-        )
-        p[0].set_dashes(dashseq[-1])
-
-        plt.figure("upup")
-        p = plt.plot(
-            vpscale * group[idx].upup + group[idx].x, group[idx].y, lw=2, color=cmap[-2]
-        )
-        p[0].set_dashes(dashseq[-1])
-
-        plt.figure("vpvp")
-        p = plt.plot(
-            vpscale * group[idx].vpvp + group[idx].x, group[idx].y, lw=2, color=cmap[-2]
+        add_artist(
+            pages["u"],
+            "plot",
+            group[idx].u + group[idx].x,
+            group[idx].y,
+            lw=2,
+            color=cmap[-2],
+            dashes=dashseq[-1],
         )
-        p[0].set_dashes(dashseq[-1])
-
-        plt.figure("upvp")
-        p = plt.plot(
-            vpscale * group[idx].upvp + group[idx].x, group[idx].y, lw=2, color=cmap[-2]
+        add_artist(
+            pages["v"],
+            "plot",
+            vscale * group[idx].v + group[idx].x,
+            group[idx].y,
+            lw=2,
+            color=cmap[-2],
+            dashes=dashseq[-1],
         )
-        p[0].set_dashes(dashseq[-1])
+        for fld in ["upup", "vpvp", "upvp"]:
+            add_artist(
+                pages[fld],
+                "plot",
+                vpscale * group[idx][fld] + group[idx].x,
+                group[idx].y,
+                lw=2,
+                color=cmap[-2],
+                dashes=dashseq[-1],
+            )
 
-    cf = pd.read_csv(
-        os.path.join(ldir, "hill_LES_cf_digitized.dat"), delim_whitespace=True
+    for name in ["u", "v", "upup", "vpvp", "upvp"]:
+        add_input(pages[name], *ref.sources["exp"], *ref.sources["les"])
+    cf = ref.les_cf
+    add_input(pages["cf"], *ref.sources["les_cf"])
+    add_artist(
+        pages["cf"],
+        "plot",
+        cf.x,
+        cf.cf,
+        lw=2,
+        color=cmap[-2],
+        label="LES (Breuer 2009)",
+        dashes=dashseq[-1],
     )
-    plt.figure("cf")
-    p = plt.plot(cf.x, cf.cf, lw=2, color=cmap[-2], label="LES (Breuer 2009)")
-    p[0].set_dashes(dashseq[-1])
 
     # # CDP v2f
-    # legend_elements += (Line2D([0], [0], lw=2, color=cmap[2], label="CDP-v2f"),)
-    # grouped = v2fdf.groupby(["x"])
+    # legend_elements += [dict(lw=2, color=cmap[2], label="CDP-v2f")]
+    # grouped = ref.cdp_v2f.groupby(["x"])
     # for k, (name, group) in enumerate(grouped):
-    #     plt.figure("u")
-    #     p = plt.plot(group.u, group.y, lw=2, color=cmap[2])
+    #     add_artist(pages["u"], "plot", group.u, group.y, lw=2, color=cmap[2])
 
     # # CDP AMS
-    # legend_elements += (Line2D([0], [0], lw=2, color=cmap[3], label="CDP-v2f-AMS"),)
-    # grouped = amsdf.groupby(["x"])
+    # legend_elements += [dict(lw=2, color=cmap[3], label="CDP-v2f-AMS")]
+    # grouped = ref.cdp_ams.groupby(["x"])
     # for k, (name, group) in enumerate(grouped):
-    #     plt.figure("u")
-    #     p = plt.plot(group.u, group.y, lw=2, color=cmap[3])
+    #     add_artist(pages["u"], "plot", group.u, group.y, lw=2, color=cmap[3])
 
     # Nalu data
+    fronts = {}
     for i, fdir in enumerate(args.fdir):
 
         yname = os.path.join(os.path.dirname(fdir), "periodicHill.yaml")
         u0, rho0, mu, turb_model = parse_ic(yname)
         model = turb_model.upper().replace("_", "-")
-        legend_elements += [Line2D([0], [0], lw=2, color=cmap[i], label=f"{model}")]
+        legend_elements += [dict(lw=2, color=cmap[i], label=f"{model}")]
+        line = dict(lw=2, color=cmap[i], dashes=dashseq[i])
+        for page in pages.values():
+            add_input(page, yname)
 
         h = 1.0
         tau = h / u0
         dynPres = rho0 * 0.5 * u0 * u0
-        ndf = pd.read_csv(os.path.join(fdir, "profiles.dat"))
+        for name in ["u", "v", "upup", "vpvp", "upvp"]:
+            add_input(pages[name], datafiles.table_file(os.path.join(fdir, "profiles")))
+        ndf = datafiles.read_table(os.path.join(fdir, "profiles"))
         ndf.loc[ndf.u > 5, ["u", "v", "w"]] = 0.0
         grouped = ndf.groupby(["x"])
         for k, (name, group) in enumerate(grouped):
             idx = group.y.values >= utilities.hill(group.x.values)
-            plt.figure("u")
-            p = plt.plot(group[idx].u + group[idx].x, group[idx].y, lw=2, color=cmap[i])
-            p[0].set_dashes(dashseq[i])
-
-            plt.figure("v")
-            p = plt.plot(
-                vscale * group[idx].v + group[idx].x, group[idx].y, lw=2, color=cmap[i]
+            add_artist(
+                pages["u"], "plot", group[idx].u + group[idx].x, group[idx].y, **line
+            )
+            add_artist(
+                pages["v"],
+                "plot",
+                vscale * group[idx].v + group[idx].x,
+                group[idx].y,
+                **line,
             )
-            p[0].set_dashes(dashseq[i])
 
             if "tau_xx" in group[idx]:
-                plt.figure("upup")
-                p = plt.plot(
-                    vpscale * (group[idx].upup - group[idx].tau_xx) + group[idx].x,
-                    group[idx].y,
-                    lw=2,
-                    color=cmap[i],
-                )
-                p[0].set_dashes(dashseq[i])
-
-                plt.figure("vpvp")
-                p = plt.plot(
-                    vpscale * (group[idx].vpvp - group[idx].tau_yy) + group[idx].x,
-                    group[idx].y,
-                    lw=2,
-                    color=cmap[i],
-                )
-                p[0].set_dashes(dashseq[i])
-
-                plt.figure("upvp")
-                p = plt.plot(
-                    vpscale * (group[idx].upvp - group[idx].tau_xy) + group[idx].x,
-                    group[idx].y,
-                    lw=2,
-                    color=cmap[i],
-                )
-                p[0].set_dashes(dashseq[i])
-
-        cf = pd.read_csv(os.path.join(fdir, "tw.dat"))
+                for fld, tau_ij in [
+                    ("upup", "tau_xx"),
+                    ("vpvp", "tau_yy"),
+                    ("upvp", "tau_xy"),
+                ]:
+                    add_artist(
+                        pages[fld],
+                        "plot",
+                        vpscale * (group[idx][fld] - group[idx][tau_ij]) + group[idx].x,
+                        group[idx].y,
+                        **line,
+                    )
+
+        add_input(pages["cf"], datafiles.table_file(os.path.join(fdir, "tw")))
+        cf = datafiles.read_table(os.path.join(fdir, "tw"))
         cf["cf"] = cf.tauwx / dynPres
-        plt.figure("cf")
-        p = plt.plot(cf.x, cf.cf, lw=2, color=cmap[i], label=f"{model}")
-        p[0].set_dashes(dashseq[i])
-
-        inlet = pd.read_csv(os.path.join(fdir, "inlet.dat"))
-        plt.figure("u_inlet")
-        p = plt.plot(inlet.t / tau, inlet.u, lw=2, color=cmap[i], label=f"{model}")
-        p[0].set_dashes(dashseq[i])
-
-        plt.figure("tke_inlet")
-        p = plt.plot(inlet.t / tau, inlet.tke, lw=2, color=cmap[i], label=f"{model}")
-        p[0].set_dashes(dashseq[i])
+        add_artist(pages["cf"], "plot", cf.x, cf.cf, label=f"{model}", **line)
 
-        plt.figure("sdr_inlet")
-        p = plt.plot(inlet.t / tau, inlet.sdr, lw=2, color=cmap[i], label=f"{model}")
-        p[0].set_dashes(dashseq[i])
+        inlet = datafiles.read_table(os.path.join(fdir, "inlet"))
+        for fld in ["u", "tke", "sdr"]:
+            add_input(
+                pages[f"{fld}_inlet"], datafiles.table_file(os.path.join(fdir, "inlet"))
+            )
+            add_artist(
+                pages[f"{fld}_inlet"],
+                "plot",
+                inlet.t / tau,
+                inlet[fld],
+                label=f"{model}",
+                **line,
+            )
 
-        front = pd.read_csv(os.path.join(fdir, "f_front.dat"))
+        # Skip the front contour maps if they are cached and up to date
+        group = f"front-{i}-{model}"
+        inputs = [
+            os.path.abspath(__file__),
+            yname,
+            datafiles.table_file(os.path.join(fdir, "f_front")),
+        ]
+        names = None if cache is None else cache.cached(group, inputs)
+        if names is not None:
+            for name in names:
+                new_page(fronts, name, group=group, inputs=inputs)
+            continue
+
+        front = datafiles.read_table(os.path.join(fdir, "f_front"), mmap=True)
         xmin, xmax = front.x.min(), front.x.max()
         ymin, ymax = front.y.min(), front.y.max()
-        nx = 1000
+        nx = 1000 if args.front_dpi is None else int(figsize[0] * args.front_dpi)
         ny = int(nx / (ymax - ymin))
-        xg, yg = np.meshgrid(np.linspace(xmin, xmax, nx), np.linspace(ymin, ymax, ny))
+        raster = None
 
         fields = {
             "u": {"vmin": -0.2, "vmax": 1.3},
@@ -390,11 +653,26 @@ if __name__ == "__main__":
         }
         for name, opt in fields.items():
             if name in front.columns:
-                plt.figure(f"{name}-front-{model}", figsize=figsize)
-                dat = griddata(
-                    (front.x, front.y), front[name], (xg, yg), method="linear"
+                page = new_page(
+                    fronts,
+                    f"{name}-front-{model}",
+                    figsize=figsize,
+                    hill=20,
+                    xlabel=r"$x / h$",
+                    ylabel=r"$y / h$",
+                    group=group,
+                    inputs=inputs,
                 )
-                plt.imshow(
+                if raster is None:
+                    raster = interpolation.GridRasterizer(
+                        np.column_stack((front.x, front.y)),
+                        [xmin, xmax, ymin, ymax],
+                        (ny, nx),
+                    )
+                dat = raster(front[name].values)
+                add_artist(
+                    page,
+                    "imshow",
                     dat,
                     origin="lower",
                     extent=[xmin, xmax, ymin, ymax],
@@ -403,150 +681,5 @@ if __name__ == "__main__":
                 )
 
     # Save the plots
-    with PdfPages(fname) as pdf:
-        x_hill = np.linspace(0, 9, 100)
-        y_hill = utilities.hill(x_hill)
-
-        plt.figure("u")
-        ax = plt.gca()
-        plt.fill_between(
-            x_hill, np.zeros(x_hill.shape), y_hill, color="darkgray", zorder=0
-        )
-        plt.xlabel(r"$\langle u \rangle / u_0 + x/h$", fontsize=22, fontweight="bold")
-        plt.ylabel(r"$y / h$", fontsize=22, fontweight="bold")
-        plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
-        plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
-        plt.xlim([-0.5, 9.5])
-        plt.ylim([0, 3.5])
-        legend = ax.legend(handles=legend_elements, loc="best")
-        plt.tight_layout()
-        pdf.savefig(dpi=300)
-
-        plt.figure("v")
-        ax = plt.gca()
-        plt.fill_between(
-            x_hill, np.zeros(x_hill.shape), y_hill, color="darkgray", zorder=0
-        )
-        plt.xlabel(
-            f"${vscale}\langle v \\rangle / u_0 + x/h$", fontsize=22, fontweight="bold"
-        )
-        plt.ylabel(r"$y / h$", fontsize=22, fontweight="bold")
-        plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
-        plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
-        plt.xlim([-0.5, 9.5])
-        plt.ylim([0, 3.5])
-        legend = ax.legend(handles=legend_elements, loc="best")
-        plt.tight_layout()
-        pdf.savefig(dpi=300)
-
-        plt.figure("upup")
-        ax = plt.gca()
-        plt.fill_between(
-            x_hill, np.zeros(x_hill.shape), y_hill, color="darkgray", zorder=0
-        )
-        plt.xlabel(
-            f"${vpscale}\langle u'u' \\rangle / u_0^2 + x/h$",
-            fontsize=22,
-            fontweight="bold",
-        )
-        plt.ylabel(r"$y / h$", fontsize=22, fontweight="bold")
-        plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
-        plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
-        plt.xlim([-0.5, 9.5])
-        plt.ylim([0, 3.5])
-        legend = ax.legend(handles=legend_elements, loc="best")
-        plt.tight_layout()
-        pdf.savefig(dpi=300)
-
-        plt.figure("vpvp")
-        ax = plt.gca()
-        plt.fill_between(
-            x_hill, np.zeros(x_hill.shape), y_hill, color="darkgray", zorder=0
-        )
-        plt.xlabel(
-            f"${vpscale}\langle v'v' \\rangle / u_0^2 + x/h$",
-            fontsize=22,
-            fontweight="bold",
-        )
-        plt.ylabel(r"$y / h$", fontsize=22, fontweight="bold")
-        plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
-        plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
-        plt.xlim([-0.5, 9.5])
-        plt.ylim([0, 3.5])
-        legend = ax.legend(handles=legend_elements, loc="best")
-        plt.tight_layout()
-        pdf.savefig(dpi=300)
-
-        plt.figure("upvp")
-        ax = plt.gca()
-        plt.fill_between(
-            x_hill, np.zeros(x_hill.shape), y_hill, color="darkgray", zorder=0
-        )
-        plt.xlabel(
-            f"${vpscale}\langle u'v' \\rangle/u_0^2 + x/h$",
-            fontsize=22,
-            fontweight="bold",
-        )
-        plt.ylabel(r"$y / h$", fontsize=22, fontweight="bold")
-        plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
-        plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
-        plt.xlim([-0.5, 9.5])
-        plt.ylim([0, 3.5])
-        legend = ax.legend(handles=legend_elements, loc="best")
-        plt.tight_layout()
-        pdf.savefig(dpi=300)
-
-        plt.figure("cf")
-        ax = plt.gca()
-        plt.xlabel(r"$x/h$", fontsize=22, fontweight="bold")
-        plt.ylabel(r"$c_f$", fontsize=22, fontweight="bold")
-        plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
-        plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
-        legend = ax.legend(loc="best")
-        plt.tight_layout()
-        pdf.savefig(dpi=300)
-
-        plt.figure("u_inlet")
-        ax = plt.gca()
-        plt.xlabel(r"$t / \tau$", fontsize=22, fontweight="bold")
-        plt.ylabel(r"$\bar{u} (x=0)$", fontsize=22, fontweight="bold")
-        plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
-        plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
-        legend = ax.legend(loc="best")
-        plt.tight_layout()
-        pdf.savefig(dpi=300)
-
-        plt.figure("tke_inlet")
-        ax = plt.gca()
-        plt.xlabel(r"$t / \tau$", fontsize=22, fontweight="bold")
-        plt.ylabel(r"$\bar{k} (x=0)$", fontsize=22, fontweight="bold")
-        plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
-        plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
-        legend = ax.legend(loc="best")
-        plt.tight_layout()
-        pdf.savefig(dpi=300)
-
-        plt.figure("sdr_inlet")
-        ax = plt.gca()
-        plt.xlabel(r"$t / \tau$", fontsize=22, fontweight="bold")
-        plt.ylabel(r"$\bar{\omega} (x=0)$", fontsize=22, fontweight="bold")
-        plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
-        plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
-        legend = ax.legend(loc="best")
-        plt.tight_layout()
-        pdf.savefig(dpi=300)
-
-        for i in plt.get_figlabels():
-            if "-front-" in i:
-                plt.figure(i)
-                ax = plt.gca()
-                plt.fill_between(
-                    x_hill, np.zeros(x_hill.shape), y_hill, color="darkgray", zorder=20
-                )
-                plt.colorbar()
-                plt.xlabel(r"$x / h$", fontsize=22, fontweight="bold")
-                plt.ylabel(r"$y / h$", fontsize=22, fontweight="bold")
-                plt.setp(ax.get_xmajorticklabels(), fontsize=18, fontweight="bold")
-                plt.setp(ax.get_ymajorticklabels(), fontsize=18, fontweight="bold")
-                plt.tight_layout()
-                pdf.savefig(dpi=300)
+    pages.update(fronts)
+    save_pages(pages, fname, nprocs=args.nprocs, cache=cache)
@@ -6,12 +6,22 @@
 import argparse
 import os
 import numpy as np
-import scipy.spatial.qhull as qhull
-import pandas as pd
 from mpi4py import MPI
 import stk
 import utilities
-from scipy.interpolate import griddata
+import accumulators
+import layout
+import parallel
+import datafiles
+import geometry
+import profiling
+import prefetch
+import sources
+import timesteps
+import convergence
+import planepool
+
+pd = utilities.lazy_import("pandas")
 
 
 # ========================================================================
@@ -19,35 +29,67 @@ from scipy.interpolate import griddata
 # Functions
 #
 # ========================================================================
-def p0_printer(par):
-    iproc = par.rank
+field_names = ["u", "v", "w", "tke", "sdr", "tau_xx", "tau_xy", "tau_yy"]
 
-    def printer(*args, **kwargs):
-        if iproc == 0:
-            print(*args, **kwargs)
 
-    return printer
+# ========================================================================
+def wall_fields(mesh):
+    """Wall shear stress fields, their names and number of components"""
+    names = ["tau_wall", "tau_wall_vector"]
+    return [mesh.meta.get_field(name) for name in names], names, [1, 3]
 
 
 # ========================================================================
-def interp_weights(xyz, uvw):
-    """Find the interpolation weights
+def interior_fields(mesh, is_ams):
+    """Fields needed on the interior nodes, their names and components
 
-    See: https://stackoverflow.com/questions/20915502/speedup-scipy-griddata-for-multiple-interpolations-between-two-irregular-grids
+    The instantaneous velocity comes first, followed by the (average)
+    velocity and the fields used to compute the averages.
     """
-    d = 3
-    tri = qhull.Delaunay(xyz)
-    simplex = tri.find_simplex(uvw)
-    vertices = np.take(tri.simplices, simplex, axis=0)
-    temp = np.take(tri.transform, simplex, axis=0)
-    delta = uvw - temp[:, d]
-    bary = np.einsum("njk,nk->nj", temp[:, :d, :], delta)
-    return vertices, np.hstack((bary, 1 - bary.sum(axis=1, keepdims=True)))
+    pfx_vel = "average_" if is_ams else ""
+    names = ["velocity"]
+    ncomps = [3]
+    if is_ams:
+        names += ["average_velocity"]
+        ncomps += [3]
+    names += [
+        "turbulent_ke",
+        "specific_dissipation_rate",
+        pfx_vel + "dudx",
+        "turbulent_viscosity",
+        "density",
+    ]
+    ncomps += [1, 1, 9, 1, 1]
+    if is_ams:
+        names += ["k_ratio"]
+        ncomps += [1]
+
+    return [mesh.meta.get_field(name) for name in names], names, ncomps
 
 
 # ========================================================================
-def interpolate(values, vtx, wts):
-    return np.einsum("nj,nj->n", np.take(values, vtx), wts)
+def average_fields(raw, ncomps, is_ams):
+    """Compute the fields to average from the gathered interior fields"""
+    cols = [raw[:, s] for s in layout.column_slices(ncomps)]
+    if is_ams:
+        vel, avel, tke, sdr, dudx, nut, rho, krat = cols
+        alpha = krat[:, 0] ** 1.7
+        krat = krat[:, 0]
+    else:
+        vel, tke, sdr, dudx, nut, rho = cols
+        avel = vel
+        alpha = 1
+        krat = 1
+    tke, nut, rho = tke[:, 0], nut[:, 0], rho[:, 0]
+
+    # tauSGRS_ij = coeffSGRS *(avgdudx[:, i * 3 + j] + avgdudx[:, j * 3 + i]) + 2/3 rho k delta_ij
+    coeffSGRS = alpha * (2.0 - alpha) * nut / rho
+    diag_tke = -2.0 / 3.0 * rho * tke * krat
+    tausgrs_xx = coeffSGRS * (dudx[:, 0] + dudx[:, 0]) + diag_tke
+    tausgrs_xy = coeffSGRS * (dudx[:, 1] + dudx[:, 3])
+    tausgrs_yy = coeffSGRS * (dudx[:, 4] + dudx[:, 4]) + diag_tke
+
+    return np.column_stack((avel, tke, sdr[:, 0], tausgrs_xx, tausgrs_xy, tausgrs_yy))
 
 
 # ========================================================================
@@ -66,7 +108,18 @@ if __name__ == "__main__":
         required=True,
         type=str,
     )
-    parser.add_argument("--auto_decomp", help="Auto-decomposition", action="store_true")
+    parser.add_argument(
+        "--auto_decomp",
+        help="Auto-decompose the joined database (even if pre-decomposed files"
+        " match the number of ranks)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--source",
+        help="Database to read (results or the restart/<name>.rst of the case)",
+        choices=["results", "restart"],
+        default="results",
+    )
     parser.add_argument(
         "--navg", help="Number of times to average", default=10, type=int
     )
@@ -79,24 +132,117 @@ if __name__ == "__main__":
         type=float,
         default=1.2,
     )
+    parser.add_argument(
+        "--window",
+        help="Selection of the time steps to average (the steps nearest to"
+        " multiples of the flowthrough time factor, the last navg steps, every"
+        " step or every step from the last until convergence). The field"
+        " averages weigh the selected steps, the plane velocity statistics and"
+        " mean velocity (except the average velocity of AMS runs) use every step",
+        choices=timesteps.strategies,
+        default="flowthrough",
+    )
+    parser.add_argument(
+        "--tol",
+        help="Stop averaging once the relative change of the plane velocity"
+        " statistics, the field averages and tau_wall between steps is below tol"
+        " (requires --window converge)",
+        type=float,
+    )
+    parser.add_argument(
+        "--patience",
+        help="Number of consecutive steps below tol to stop averaging",
+        default=3,
+        type=int,
+    )
+    parser.add_argument(
+        "--tstart", help="Only average the steps after this time", type=float
+    )
+    parser.add_argument(
+        "--tend", help="Only average the steps before this time", type=float
+    )
+    parser.add_argument(
+        "--stats",
+        help="Save the plane statistics and averages to this file (for later merging)",
+        type=str,
+    )
+    parser.add_argument(
+        "--merge_stats",
+        help="Merge plane statistics and averages saved from other segments",
+        nargs="+",
+        default=[],
+        type=str,
+    )
+    parser.add_argument(
+        "--distribute_planes",
+        help="Interpolate each plane on its own rank instead of rank 0",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--format",
+        help="Output format (csv text or binary columnar npy)",
+        choices=["csv", "npy"],
+        default="csv",
+    )
+    parser.add_argument(
+        "--mem_budget",
+        help="Memory budget (MB) per rank of the slab fields: the per-node sums and"
+        " staged fields, the rest sizing the chunks of the gathers (default: no"
+        " chunking)",
+        type=float,
+    )
+    parser.add_argument(
+        "--precision",
+        help="Precision of the gathered fields, exchanges and output files",
+        choices=list(datafiles.precisions),
+        default="double",
+    )
+    parser.add_argument(
+        "--nworkers",
+        help="Number of processes interpolating the planes of each rank",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--prefetch",
+        help="Read the next time step in a background thread",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Write a timing and memory report of the phases (pp_timings)",
+        action="store_true",
+    )
     args = parser.parse_args()
+    if args.tol is not None and args.window != "converge":
+        parser.error("--tol requires --window converge")
 
     fdir = os.path.dirname(args.mfile)
+    dtype = datafiles.precisions[args.precision]
 
-    comm = MPI.COMM_WORLD
+    # The reader thread (stk) uses MPI_COMM_WORLD: the collectives of
+    # this script go through their own communicator when prefetching
+    threaded = args.prefetch and prefetch.threads_supported()
+    comm = MPI.COMM_WORLD.Dup() if threaded else MPI.COMM_WORLD
     size = comm.Get_size()
     rank = comm.Get_rank()
     par = stk.Parallel.initialize()
-    printer = p0_printer(par)
-
-    mesh = stk.StkMesh(par)
-    printer("Reading meta data for mesh: ", args.mfile)
-    mesh.read_mesh_meta_data(args.mfile, auto_decomp=args.auto_decomp)
-    printer("Done reading meta data")
-
-    printer("Loading bulk data for mesh: ", args.mfile)
-    mesh.populate_bulk_data()
-    printer("Done reading bulk data")
+    printer = utilities.p0_printer(par)
+    prof = profiling.Profiler(comm, args.profile)
+
+    with prof.phase("mesh"):
+        mesh = stk.StkMesh(par)
+        # pre-decomposed files are read directly when there is one per rank
+        fname = sources.database(args.mfile, args.source)
+        fname, auto_decomp = sources.decomposition(fname, size, args.auto_decomp)
+        printer("Reading meta data for mesh: ", fname)
+        printer(f"Auto-decomposition: {auto_decomp}")
+        mesh.read_mesh_meta_data(fname, auto_decomp=auto_decomp)
+        printer("Done reading meta data")
+
+        printer("Loading bulk data for mesh: ", fname)
+        mesh.populate_bulk_data()
+        printer("Done reading bulk data")
 
     num_time_steps = mesh.stkio.num_time_steps
     max_time = mesh.stkio.max_time
@@ -104,221 +250,264 @@ if __name__ == "__main__":
     printer(f"""Num. time steps = {num_time_steps}\nMax. time step  = {max_time}""")
 
     # Figure out the times over which to average
-    if args.factor > 0:
-        tmp_tavg = np.sort(
-            tsteps[-1] - args.flowthrough * args.factor * np.arange(args.navg)
-        )
-        dist = np.abs(np.array(tsteps)[:, np.newaxis] - tmp_tavg)
-        idx = dist.argmin(axis=0)
-    else:
-        idx = np.arange(len(tsteps) - args.navg, len(tsteps))
-    tavg = tsteps[idx]
-    tavg_instantaneous = tsteps[idx[0] :]
+    strategy = args.window
+    if strategy == "flowthrough" and args.factor <= 0:
+        strategy = "last"
+    window = timesteps.select(
+        tsteps,
+        strategy,
+        navg=args.navg,
+        spacing=args.flowthrough * args.factor,
+        start=args.tstart,
+        end=args.tend,
+    )
+    if len(window.duplicates) > 0:
+        printer(f"Skipping {len(window.duplicates)} duplicate time steps:")
+        printer(window.duplicates)
     printer("Averaging the following steps:")
-    printer(tavg)
-
-    # Extract time and spanwise average tau_wall on wall
-    tw_data = None
-    for tstep in tavg_instantaneous:
-        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
-        printer(f"Loading tau_wall fields for time: {ftime}")
-
-        coords = mesh.meta.coordinate_field
-        wall = mesh.meta.get_part("wall")
-        sel = wall & mesh.meta.locally_owned_part
-        tauw = mesh.meta.get_field("tau_wall")
-        tauwv = mesh.meta.get_field("tau_wall_vector")
-        names = ["x", "y", "z", "tauw", "tauwx", "tauwy", "tauwz"]
-        nnodes = sum(bkt.size for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
-
-        cnt = 0
-        data = np.zeros((nnodes, len(names)))
-        for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK):
-            xyz = coords.bkt_view(bkt)
-            tw = tauw.bkt_view(bkt)
-            twv = tauwv.bkt_view(bkt)
-            data[cnt : cnt + bkt.size, :] = np.hstack((xyz, tw.reshape(-1, 1), twv))
-            cnt += bkt.size
-
-        if tw_data is None:
-            tw_data = np.zeros(data.shape)
-        tw_data += data / len(tavg_instantaneous)
-
-    lst = comm.gather(tw_data, root=0)
-    comm.Barrier()
-    if rank == 0:
-        df = pd.DataFrame(np.vstack(lst), columns=names)
-        tw = df.groupby("x", as_index=False).mean().sort_values(by=["x"])
-        twname = os.path.join(fdir, "tw.dat")
-        tw.to_csv(twname, index=False)
+    printer(window.averaged)
 
-    # Extract average data
     fld = mesh.meta.get_field("average_velocity")
     is_ams = not fld.is_null
-    pfx_vel = "average_" if is_ams else ""
-    vel_name = pfx_vel + "velocity"
-    dudx_name = pfx_vel + "dudx"
-    field_names = ["u", "v", "w", "tke", "sdr", "tau_xx", "tau_xy", "tau_yy"]
-    fld_data = None
-    for tstep in tavg:
-        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
-        printer(f"""Loading {vel_name} fields for time: {ftime}""")
-
-        interior = mesh.meta.get_part("interior-hex")
-        sel = interior & mesh.meta.locally_owned_part
-        coords = mesh.meta.coordinate_field
-        turbulent_ke = mesh.meta.get_field("turbulent_ke")
-        specific_dissipation_rate = mesh.meta.get_field("specific_dissipation_rate")
-        fields = [
-            mesh.meta.get_field(vel_name),
-            turbulent_ke,
-            specific_dissipation_rate,
-        ]
-        dveldx = mesh.meta.get_field(dudx_name)
-        tvisc = mesh.meta.get_field("turbulent_viscosity")
-        density = mesh.meta.get_field("density")
-        k_ratio = mesh.meta.get_field("k_ratio")
-        names = ["x", "y", "z"] + field_names
-        nnodes = sum(bkt.size for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
-
-        cnt = 0
-        data = np.zeros((nnodes, len(names)))
-
-        for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK):
-            arr = coords.bkt_view(bkt)
-            for fld in fields:
-                vals = fld.bkt_view(bkt)
-                if len(vals.shape) == 1:  # its a scalar
-                    vals = vals.reshape(-1, 1)
-                arr = np.hstack((arr, vals))
-
-            # tauSGRS_ij = coeffSGRS *(avgdudx[:, i * 3 + j] + avgdudx[:, j * 3 + i]) + 2/3 rho k delta_ij
-            dudx = dveldx.bkt_view(bkt)
-            nut = tvisc.bkt_view(bkt)
-            rho = density.bkt_view(bkt)
-            tke = turbulent_ke.bkt_view(bkt)
-            if is_ams:
-                alpha = k_ratio.bkt_view(bkt) ** 1.7
-                krat = k_ratio.bkt_view(bkt)
-            else:
-                alpha = 1
-                krat = 1
-            coeffSGRS = alpha * (2.0 - alpha) * nut / rho
-            diag_tke = (-2.0 / 3.0 * rho * tke * krat).reshape(-1,1)
-            tausgrs_xx = (coeffSGRS * (dudx[:, 0] + dudx[:, 0])).reshape(-1, 1) + diag_tke
-            tausgrs_xy = (coeffSGRS * (dudx[:, 1] + dudx[:, 3])).reshape(-1, 1)
-            tausgrs_yy = (coeffSGRS * (dudx[:, 4] + dudx[:, 4])).reshape(-1, 1) + diag_tke
-            arr = np.hstack((arr, tausgrs_xx))
-            arr = np.hstack((arr, tausgrs_xy))
-            arr = np.hstack((arr, tausgrs_yy))
-            data[cnt : cnt + bkt.size, :] = arr
-            cnt += bkt.size
-
-        if fld_data is None:
-            fld_data = np.zeros(data.shape)
-        fld_data += data / len(tavg)
-
-    # Subset the velocities on planes
+    if is_ams:
+        printer("Profiles: u, v (average velocity) averaged over the selected steps")
+        printer("Profiles: upup, vpvp, upvp over every step read")
+    else:
+        printer("Profiles: u, v, upup, vpvp, upvp over every step read")
+    printer("Profiles: other fields averaged over the selected steps")
     ninterp = 200
     dx = 0.05 * 4
-    planes = []
-    for x in utilities.xplanes():
-
-        # subset the data around the plane of interest
-        sub = fld_data[(x - dx <= fld_data[:, 0]) & (fld_data[:, 0] <= x + dx), :]
-
-        lst = comm.gather(sub, root=0)
-        comm.Barrier()
-        if rank == 0:
-            xi = np.array([x])
-            df = (
-                pd.DataFrame(np.vstack(lst), columns=names)
-                .groupby(["x", "y"], as_index=False)
-                .mean()
-                .sort_values(by=["x", "y"])
+    xplanes = utilities.xplanes()
+
+    # With threads, the next step is read while the current one is
+    # processed (a step is staged in each of the buffers)
+    if args.prefetch and not threaded:
+        printer("MPI does not support threads, reading the steps synchronously")
+    nbuffers = 2 if threaded else 1
+
+    with prof.phase("layout"):
+        # Node layouts (and coordinates) of the wall and interior nodes
+        wall = layout.BucketLayout(
+            mesh, mesh.meta.get_part("wall") & mesh.meta.locally_owned_part
+        )
+        interior = layout.BucketLayout(
+            mesh, mesh.meta.get_part("interior-hex") & mesh.meta.locally_owned_part
+        )
+        tw_fields, tw_fnames, tw_ncomps = wall_fields(mesh)
+        int_fields, int_fnames, int_ncomps = interior_fields(mesh, is_ams)
+        missing = sources.missing_fields(tw_fields + int_fields, tw_fnames + int_fnames)
+        if missing:
+            raise RuntimeError(f"{fname} does not have the fields: {missing}")
+        slabs = layout.SlabIndex(interior.coords[:, 0], xplanes, dx)
+
+        # Only the slab nodes are read and averaged. The sums (and their
+        # compensation), the staged velocities (and averages with threads)
+        # and the averages kept by the convergence monitor (in double
+        # precision) hold every slab node, the gathers and the average
+        # temporaries are done in chunks that fit in the rest of the budget.
+        slab_nodes = np.unique(np.concatenate(slabs.slabs))
+        chunk_rows = None
+        if args.mem_budget is not None:
+            itemsize = np.dtype(dtype).itemsize
+            staged_cols = 2 + (len(field_names) if threaded else 0)
+            fixed = (
+                itemsize
+                * len(slab_nodes)
+                * (nbuffers * staged_cols + 2 * len(field_names))
             )
-            ymin, ymax = utilities.hill(xi)[0], df.y.max()
+            if args.tol is not None:
+                fixed += 8 * len(slab_nodes) * 2 * len(field_names)
+            fixed = comm.allreduce(fixed, op=MPI.MAX)
+            budget = args.mem_budget * 1024**2
+            if fixed >= budget:
+                raise RuntimeError(
+                    f"Memory budget below the {fixed / 1024**2:.3g} MB of the"
+                    f" arrays holding every slab node"
+                )
+            row_bytes = itemsize * (sum(int_ncomps) + 4 * len(field_names))
+            chunk_rows = int((budget - fixed) / row_bytes)
+        rows = layout.RowChunks(interior, slab_nodes, chunk_rows)
+        slab_rows = [rows.index(slab) for slab in slabs]
+        int_buf = rows.empty(sum(int_ncomps), dtype)
+        printer(f"Averaging the slab nodes in {len(rows)} chunk(s)")
+
+        # Each plane is interpolated on its owner rank. The slab coordinates
+        # are sent once, only the velocities are exchanged at every step.
+        owners = parallel.block_owners(len(xplanes), size, args.distribute_planes)
+        exchange = parallel.BlockExchange(comm, [len(slab) for slab in slabs], owners)
+        plane_xyz = exchange([interior.coords[slab, :] for slab in slabs])
+        planes = {}
+        stats = {}
+        for k, xyz in plane_xyz.items():
+            ymin, ymax = geometry.hill_at(xplanes[k]), xyz[:, 1].max()
             yi = np.linspace(ymin, ymax, ninterp)
-
-            means = {}
-            for fld in field_names:
-                means[fld] = griddata(
-                    (df.x, df.y),
-                    df[fld],
-                    (xi[None, :], yi[:, None]),
-                    method="cubic",
-                    fill_value=0,
-                ).flatten()
-            means["x"] = x * np.ones(yi.shape)
-            means["y"] = yi
-
-            planes.append(pd.DataFrame(means))
-
-    # Extract fluctuating velocities
-    if rank == 0:
-        for plane in planes:
-            plane["upup"] = np.zeros(plane.u.shape)
-            plane["vpvp"] = np.zeros(plane.u.shape)
-            plane["upvp"] = np.zeros(plane.u.shape)
-
-    for tstep in tavg_instantaneous:
-        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
-        printer(f"Loading velocity fields for time: {ftime}")
-
-        interior = mesh.meta.get_part("interior-hex")
-        sel = interior & mesh.meta.locally_owned_part
-        velocity = mesh.meta.get_field("velocity")
-        names = ["x", "y", "z", "u", "v", "w"]
-        nnodes = sum(bkt.size for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
-
-        cnt = 0
-        data = np.zeros((nnodes, len(names)))
-        for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK):
-            xyz = coords.bkt_view(bkt)
-            vel = velocity.bkt_view(bkt)
-            data[cnt : cnt + bkt.size, :] = np.hstack((xyz, vel))
-            cnt += bkt.size
-
-        # subset the data around the plane of interest
-        for k, x in enumerate(utilities.xplanes()):
-            sub = data[(x - dx <= data[:, 0]) & (data[:, 0] <= x + dx), :]
-
-            lst = comm.gather(sub, root=0)
-            comm.Barrier()
-            if rank == 0:
-                xi = np.array([x])
-                ymin, ymax = utilities.hill(xi)[0], df.y.max()
-                yi = np.linspace(ymin, ymax, ninterp)
-                df = pd.DataFrame(np.vstack(lst), columns=names)
-
-                grouped = df.groupby("z")
-                navg = len(tavg_instantaneous) * grouped.ngroups
-                for name, group in grouped:
-                    up = (
-                        griddata(
-                            (group.x, group.y),
-                            group.u,
-                            (xi[None, :], yi[:, None]),
-                            method="cubic",
-                            fill_value=0,
-                        ).flatten()
-                        - planes[k].u
-                    )
-                    vp = (
-                        griddata(
-                            (group.x, group.y),
-                            group.v,
-                            (xi[None, :], yi[:, None]),
-                            method="cubic",
-                            fill_value=0,
-                        ).flatten()
-                        - planes[k].v
+            targets = np.column_stack((xplanes[k] * np.ones(yi.shape), yi))
+            planes[k] = (xyz, targets)
+            stats[f"plane{k}"] = accumulators.Moments(ninterp, 2)
+        interps = planepool.PlanePool(planes, args.nworkers)
+
+    # Read each time step once and accumulate the wall shear stress, the
+    # field averages and the running statistics of the interpolated
+    # velocities on the planes. The gathered fields are stored in the
+    # requested precision and the sums are compensated.
+    tw_data = accumulators.KahanSum((wall.nnodes, sum(tw_ncomps)), dtype)
+    fld_data = accumulators.KahanSum((rows.nrows, len(field_names)), dtype)
+    nsteps, weight = 0, 0
+
+    # The fields of a step are staged by the reader and only accumulated
+    # once the step is processed. Without threads, the field averages are
+    # accumulated chunk by chunk as they are gathered instead.
+    staged = [
+        {
+            "tw": wall.empty(sum(tw_ncomps), dtype),
+            "vel": np.empty((rows.nrows, 2), dtype=dtype),
+        }
+        for _ in range(nbuffers)
+    ]
+    if threaded:
+        for buf in staged:
+            buf["avg"] = np.empty((rows.nrows, len(field_names)), dtype=dtype)
+
+    def read_step(k, slot):
+        """Read a step and stage its fields"""
+        with prof.phase("read"):
+            ftime, missing = mesh.stkio.read_defined_input_fields(window.times[k])
+        if len(missing) > 0:
+            raise RuntimeError(f"Fields missing at time {ftime}: {missing}")
+
+        with prof.phase("gather"):
+            wall.gather(tw_fields, tw_ncomps, out=staged[slot]["tw"])
+            for chunk, buf in rows.gather(int_fields, int_ncomps, out=int_buf):
+                staged[slot]["vel"][chunk] = buf[:, :2]
+                if window.counts[k] == 0:
+                    continue
+                avg = average_fields(buf, int_ncomps, is_ams)
+                if threaded:
+                    staged[slot]["avg"][chunk] = avg
+                else:
+                    fld_data.add(window.counts[k] * avg, chunk)
+        return k, ftime
+
+    monitor = convergence.Monitor(comm, args.tol, args.patience)
+    converged = False
+    with prefetch.Prefetcher(len(window), read_step, nbuffers, threaded) as reader:
+        for slot, (k, ftime) in reader:
+            printer(f"Loading fields for time: {ftime}")
+
+            with prof.phase("accumulate"):
+                tw_data.add(staged[slot]["tw"])
+                if threaded and window.counts[k] > 0:
+                    for chunk in rows.chunks:
+                        fld_data.add(
+                            window.counts[k] * staged[slot]["avg"][chunk], chunk
+                        )
+                nsteps += 1
+                weight += window.counts[k]
+
+            # every spanwise slice of the plane velocities is a sample
+            with prof.phase("exchange"):
+                vel = exchange([staged[slot]["vel"][s, :] for s in slab_rows])
+            with prof.phase("statistics"):
+                for j, res in interps(vel).items():
+                    stats[f"plane{j}"].update(res)
+
+            # Stop once the plane statistics, field averages and tau_wall
+            # have converged
+            if args.tol is not None:
+                with prof.phase("convergence"):
+                    profiles = [
+                        np.concatenate((m.mean.ravel(), m.covariance.ravel()))
+                        for m in stats.values()
+                    ]
+                    converged = monitor.update(
+                        ftime,
+                        {
+                            "profiles": np.concatenate([np.zeros(0)] + profiles),
+                            "averages": fld_data.sum / weight,
+                            "tau_wall": tw_data.sum / nsteps,
+                        },
                     )
+                if converged:
+                    printer(f"Converged after {nsteps} steps (tol = {args.tol})")
+                    break
 
-                    planes[k].upup += up * up / navg
-                    planes[k].vpvp += vp * vp / navg
-                    planes[k].upvp += up * vp / navg
+    if args.tol is not None:
+        if not converged:
+            printer(f"Not converged after {nsteps} steps (tol = {args.tol})")
+        if rank == 0:
+            datafiles.write_table(
+                monitor.table(), os.path.join(fdir, "convergence"), args.format
+            )
 
+    # Spanwise average tau_wall on wall
+    tw_names = ["x", "y", "z", "tauw", "tauwx", "tauwy", "tauwz"]
+    with prof.phase("tau_wall"):
+        tw = parallel.group_reduce(
+            comm,
+            wall.coords[:, 0],
+            np.hstack((wall.coords, tw_data.sum / nsteps)),
+        )
         if rank == 0:
+            tw = pd.DataFrame(tw, columns=tw_names)
+            datafiles.write_table(tw, os.path.join(fdir, "tw"), args.format, dtype)
+
+    # Average fields on the planes
+    means = {}
+    with prof.phase("exchange"):
+        avg = exchange([fld_data[s, :] / weight for s in slab_rows])
+    with prof.phase("interpolation"):
+        for k, res in interps.average(avg).items():
+            targets = interps.targets[k]
+            means[k] = {fld: res[:, j] for j, fld in enumerate(field_names)}
+            means[k]["x"] = targets[:, 0]
+            means[k]["y"] = targets[:, 1]
+        interps.close()
+
+    with prof.phase("gather_root"):
+        lst = comm.gather((means, stats), root=0)
+    if rank == 0:
+        with prof.phase("write"):
+            for m, s in lst:
+                means.update(m)
+                stats.update(s)
+
+            # Add the statistics and field averages from other segments
+            for k in range(len(xplanes)):
+                stats[f"average{k}"] = accumulators.WeightedMean(
+                    np.column_stack([means[k][fld] for fld in field_names]), weight
+                )
+            for fname in args.merge_stats:
+                printer(f"Merging plane statistics from: {fname}")
+                other = accumulators.load_moments(fname)
+                missing = sorted(set(stats) - set(other))
+                if missing:
+                    raise RuntimeError(f"{fname} does not have: {missing}")
+                for name, m in other.items():
+                    stats[name].merge(m)
+            if args.stats is not None:
+                accumulators.save_moments(args.stats, stats)
+
+            # The mean velocity is the one of the samples of the second
+            # moments, except for AMS where it is the average velocity field
+            planes = []
+            for k in range(len(xplanes)):
+                avg = stats[f"average{k}"].mean
+                for j, fld in enumerate(field_names):
+                    means[k][fld] = avg[:, j]
+                if not is_ams:
+                    means[k]["u"] = stats[f"plane{k}"].mean[:, 0]
+                    means[k]["v"] = stats[f"plane{k}"].mean[:, 1]
+                cov = stats[f"plane{k}"].covariance
+                means[k]["upup"] = cov[:, 0, 0]
+                means[k]["vpvp"] = cov[:, 1, 1]
+                means[k]["upvp"] = cov[:, 0, 1]
+                planes.append(pd.DataFrame(means[k]))
+
             df = pd.concat(planes)
-            df.to_csv(os.path.join(fdir, "profiles.dat"), index=False)
+            datafiles.write_table(
+                df, os.path.join(fdir, "profiles"), args.format, dtype
+            )
+
+    prof.write(os.path.join(fdir, "pp_timings"))
+    if threaded:
+        comm.Free()
@@ -6,11 +6,33 @@
 import argparse
 import os
 import numpy as np
-import scipy.spatial.qhull as qhull
-import pandas as pd
 from mpi4py import MPI
 import stk
 import utilities
+import layout
+import parallel
+import datafiles
+import profiling
+import prefetch
+import sources
+import timesteps
+
+pd = utilities.lazy_import("pandas")
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def processed(tsteps, done, rtol=1e-10):
+    """Mask of the time steps that are already in done"""
+    tsteps = np.asarray(tsteps)
+    done = np.sort(np.asarray(done, dtype=np.float64))
+    if len(done) == 0:
+        return np.zeros(tsteps.shape, dtype=bool)
+    nearest = done[timesteps.nearest(done, tsteps)]
+    return np.abs(tsteps - nearest) <= rtol * np.maximum(np.abs(tsteps), 1.0)
 
 
 # ========================================================================
@@ -27,87 +49,194 @@ if __name__ == "__main__":
     parser.add_argument(
         "-m", "--mfile", help="Root name of files to postprocess", required=True
     )
-    parser.add_argument("--auto_decomp", help="Auto-decomposition", action="store_true")
+    parser.add_argument(
+        "--auto_decomp",
+        help="Auto-decompose the joined database (even if pre-decomposed files"
+        " match the number of ranks)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--source",
+        help="Database to read (results or the restart/<name>.rst of the case)",
+        choices=["results", "restart"],
+        default="results",
+    )
     parser.add_argument("-p", "--part", help="Part to post-process", required=True)
+    parser.add_argument(
+        "--incremental",
+        help="Only process the time steps that are not in the existing output",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--flush_every",
+        help="Write the processed time steps to the output every N steps",
+        default=50,
+        type=int,
+    )
+    parser.add_argument(
+        "--format",
+        help="Output format (csv text or binary columnar npy)",
+        choices=["csv", "npy"],
+        default="csv",
+    )
+    parser.add_argument(
+        "--precision",
+        help="Precision of the gathered fields, exchanges and output files",
+        choices=list(datafiles.precisions),
+        default="double",
+    )
+    parser.add_argument(
+        "--prefetch",
+        help="Read the next time step in a background thread",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Write a timing and memory report of the phases (<part>_timings)",
+        action="store_true",
+    )
     args = parser.parse_args()
 
     fdir = os.path.dirname(args.mfile)
+    dtype = datafiles.precisions[args.precision]
 
-    comm = MPI.COMM_WORLD
+    # The reader thread (stk) uses MPI_COMM_WORLD: the collectives of
+    # this script go through their own communicator when prefetching
+    threaded = args.prefetch and prefetch.threads_supported()
+    comm = MPI.COMM_WORLD.Dup() if threaded else MPI.COMM_WORLD
     size = comm.Get_size()
     rank = comm.Get_rank()
     par = stk.Parallel.initialize()
     printer = utilities.p0_printer(par)
+    prof = profiling.Profiler(comm, args.profile)
 
-    mesh = stk.StkMesh(par)
-    printer("Reading meta data for mesh: ", args.mfile)
-    mesh.read_mesh_meta_data(args.mfile, auto_decomp=args.auto_decomp)
-    printer("Done reading meta data")
+    with prof.phase("mesh"):
+        mesh = stk.StkMesh(par)
+        # pre-decomposed files are read directly when there is one per rank
+        fname = sources.database(args.mfile, args.source)
+        fname, auto_decomp = sources.decomposition(fname, size, args.auto_decomp)
+        printer("Reading meta data for mesh: ", fname)
+        printer(f"Auto-decomposition: {auto_decomp}")
+        mesh.read_mesh_meta_data(fname, auto_decomp=auto_decomp)
+        printer("Done reading meta data")
 
-    printer("Loading bulk data for mesh: ", args.mfile)
-    mesh.populate_bulk_data()
-    printer("Done reading bulk data")
+        printer("Loading bulk data for mesh: ", fname)
+        mesh.populate_bulk_data()
+        printer("Done reading bulk data")
 
     num_time_steps = mesh.stkio.num_time_steps
     max_time = mesh.stkio.max_time
-    tsteps = mesh.stkio.time_steps
+    tsteps = np.array(mesh.stkio.time_steps)
     printer(f"""Num. time steps = {num_time_steps}\nMax. time step  = {max_time}""")
 
-    idf = pd.DataFrame(
-        {
-            "t": tsteps,
-            "u": np.zeros(len(tsteps)),
-            "tke": np.zeros(len(tsteps)),
-            "sdr": np.zeros(len(tsteps)),
-        }
-    )
-    for k, tstep in enumerate(tsteps):
-        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
-        printer(f"Loaded fields for time: {ftime}")
+    # Skip the time steps that were already processed
+    oname = os.path.join(fdir, args.part)
+    previous = None
+    if args.incremental and rank == 0 and datafiles.table_exists(oname):
+        previous = datafiles.read_table(oname)
+    done = comm.bcast([] if previous is None else previous.t.values, root=0)
+    keep, dup = timesteps.unique_steps(tsteps)
+    if len(dup) > 0:
+        printer(f"Skipping {len(dup)} duplicate time steps:")
+        printer(np.sort(tsteps[dup]))
+    tsteps = tsteps[keep]
+    last_step = tsteps[-1]
+    tsteps = [t for t, d in zip(tsteps, processed(tsteps, done)) if not d]
+    printer(f"Processing {len(tsteps)} new time steps")
+
+    # Fields to extract at the part
+    fnames = ["velocity", "turbulent_ke", "specific_dissipation_rate"]
+    fields = [mesh.meta.get_field(name) for name in fnames]
+    ncomps = [3, 1, 1]
+    names = ["x", "y", "z", "u", "v", "w", "tke", "sdr"]
+    missing = sources.missing_fields(fields, fnames)
+    if missing:
+        raise RuntimeError(f"{fname} does not have the fields: {missing}")
+
+    optional_fields = {"beta": "k_ratio", "rk": "avg_res_adequacy_parameter"}
+    for key, value in optional_fields.items():
+        fld = mesh.meta.get_field(value)
+        if not fld.is_null:
+            fields.append(fld)
+            ncomps.append(1)
+            names.append(key)
 
-        coords = mesh.meta.coordinate_field
+    # Integrated quantities (every field but the coordinates and v, w)
+    integrated = [n for n in names if n not in ("x", "y", "z", "v", "w")]
+    cols = [names.index(n) for n in integrated]
+    history = np.zeros((len(tsteps), len(integrated)))
+    hnames = ["t"] + integrated
 
-        # Extract fields at the parts
+    # Append to the existing output unless its columns or format changed
+    append = previous is not None
+    same_file = datafiles.table_file(oname) == oname + datafiles.extensions[args.format]
+    if append and list(previous.columns) == hnames and same_file:
+        previous = None
+
+    with prof.phase("layout"):
         m_part = mesh.meta.get_part(args.part)
-        sel = m_part & mesh.meta.locally_owned_part
-        fields = [
-            mesh.meta.get_field("velocity"),
-            mesh.meta.get_field("turbulent_ke"),
-            mesh.meta.get_field("specific_dissipation_rate"),
-        ]
-        names = ["x", "y", "z", "u", "v", "w", "tke", "sdr"]
-
-        optional_fields = {"beta": "k_ratio", "rk": "avg_res_adequacy_parameter"}
-        for key, value in optional_fields.items():
-            fld = mesh.meta.get_field(value)
-            if not fld.is_null:
-                fields.append(fld)
-                names.append(key)
-
-        cnt = 0
-        nnodes = sum(bkt.size for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
-        data = np.zeros((nnodes, len(names)))
-        for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK):
-            arr = coords.bkt_view(bkt)
-            for fld in fields:
-                vals = fld.bkt_view(bkt)
-                if len(vals.shape) == 1:  # its a scalar
-                    vals = vals.reshape(-1, 1)
-                arr = np.hstack((arr, vals))
-            data[cnt : cnt + bkt.size, :] = arr
-            cnt += bkt.size
-
-        lst = comm.gather(data, root=0)
-        comm.Barrier()
-        if rank == 0:
-            df = pd.DataFrame(np.vstack(lst), columns=names)
-            if tstep == tsteps[-1]:
-                df.to_csv(os.path.join(fdir, f"f_{args.part}.dat"), index=False)
-            means = df.groupby("y", as_index=False).mean().sort_values(by=["y"])
-            Ly = df.y.max() - df.y.min()
-            idf.iloc[k].u = np.trapz(means.u, means.y) / Ly
-            idf.iloc[k].tke = np.trapz(means.tke, means.y) / Ly
-            idf.iloc[k].sdr = np.trapz(means.sdr, means.y) / Ly
-
-    if rank == 0:
-        idf.to_csv(os.path.join(fdir, f"{args.part}.dat"), index=False)
+        part = layout.BucketLayout(mesh, m_part & mesh.meta.locally_owned_part)
+
+    # With threads, the next step is read while the current one is reduced
+    if args.prefetch and not threaded:
+        printer("MPI does not support threads, reading the steps synchronously")
+    nbuffers = 2 if threaded else 1
+    # the coordinates stay in double precision (group keys, abscissa)
+    coords = np.asarray(part.coords, dtype=np.float64)
+    data = [part.empty(len(names) - 3, dtype) for _ in range(nbuffers)]
+
+    def read_step(k, slot):
+        """Read a step and extract the fields at the part"""
+        with prof.phase("read"):
+            ftime, missing = mesh.stkio.read_defined_input_fields(tsteps[k])
+        if len(missing) > 0:
+            raise RuntimeError(f"Fields missing at time {ftime}: {missing}")
+        with prof.phase("gather"):
+            part.gather(fields, ncomps, out=data[slot])
+        return ftime
+
+    with prefetch.Prefetcher(len(tsteps), read_step, nbuffers, threaded) as reader:
+        for k, (slot, ftime) in enumerate(reader):
+            tstep = tsteps[k]
+            printer(f"Loaded fields for time: {ftime}")
+
+            # Spanwise and streamwise average of the part
+            with prof.phase("reduce"):
+                means = parallel.group_reduce(
+                    comm, coords[:, 1], np.hstack((coords, data[slot]))
+                )
+                if rank == 0:
+                    y = means[:, 1]
+                    Ly = y.max() - y.min()
+                    history[k, :] = np.trapz(means[:, cols], y, axis=0) / Ly
+
+            if tstep == last_step:
+                with prof.phase("write"):
+                    lst = comm.gather((coords, data[slot]), root=0)
+                    if rank == 0:
+                        df = pd.DataFrame(
+                            np.vstack([np.hstack(c) for c in lst]), columns=names
+                        )
+                        datafiles.write_table(
+                            df, os.path.join(fdir, f"f_{args.part}"), args.format, dtype
+                        )
+
+            # Flush the processed time steps so that a killed job loses nothing
+            if rank == 0 and ((k + 1) % args.flush_every == 0 or k == len(tsteps) - 1):
+                with prof.phase("write"):
+                    start = (k // args.flush_every) * args.flush_every
+                    df = pd.DataFrame(history[start : k + 1, :], columns=integrated)
+                    df.insert(0, "t", tsteps[start : k + 1])
+                    if previous is not None:
+                        df = pd.concat([previous, df], ignore_index=True)
+                        previous = None
+                        append = False
+                    if append:
+                        datafiles.append_table(df, oname, args.format, dtype)
+                    else:
+                        datafiles.write_table(df, oname, args.format, dtype)
+                    append = True
+
+    prof.write(os.path.join(fdir, f"{args.part}_timings"))
+    if threaded:
+        comm.Free()
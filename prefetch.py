@@ -0,0 +1,97 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import queue
+import threading
+from mpi4py import MPI
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def threads_supported():
+    """True if MPI can be called while another thread reads"""
+    return MPI.Query_thread() == MPI.THREAD_MULTIPLE
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class Prefetcher:
+    """Load the time steps into staging buffers ahead of their processing
+
+    load(k, slot) reads the k-th step and copies what is needed into the
+    staging buffers of slot (one of nbuffers sets of buffers owned by the
+    caller). With threads, a background thread loads the next steps
+    while the current one is processed: the slots are handed over
+    through bounded queues so at most nbuffers steps are in flight and a
+    slot is only reused once its step has been processed. Without
+    threads, the steps are loaded synchronously into slot 0.
+
+    Iterating yields (slot, result of load). An error in the reader is
+    raised in the consumer and the reader thread is stopped on exit. A
+    step whose slot was handed over is always read (it can communicate),
+    so every rank stopping after the same step reads the same steps.
+    """
+
+    def __init__(self, nsteps, load, nbuffers=2, threaded=True):
+        self.nsteps = nsteps
+        self.load = load
+        self.nbuffers = nbuffers
+        self.threaded = threaded and nbuffers > 1
+        self.thread = None
+
+    def __enter__(self):
+        if self.threaded:
+            self.free = queue.Queue()
+            self.ready = queue.Queue(maxsize=self.nbuffers)
+            for slot in range(self.nbuffers):
+                self.free.put(slot)
+            self.thread = threading.Thread(target=self.reader, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def reader(self):
+        try:
+            for k in range(self.nsteps):
+                slot = self.free.get()
+                if slot is None:
+                    return
+                self.ready.put((slot, self.load(k, slot), None))
+        except BaseException as err:
+            self.ready.put((None, None, err))
+
+    def __iter__(self):
+        if not self.threaded:
+            for k in range(self.nsteps):
+                yield 0, self.load(k, 0)
+            return
+
+        for k in range(self.nsteps):
+            slot, res, err = self.ready.get()
+            if err is not None:
+                raise err
+            yield slot, res
+            self.free.put(slot)
+
+    def close(self):
+        """Stop the reader thread (unblocking it if it waits for a slot)"""
+        if self.thread is None:
+            return
+        self.free.put(None)
+        while self.thread.is_alive():
+            try:
+                self.ready.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.thread.join()
+        self.thread = None
@@ -0,0 +1,111 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import sys
+import time
+import json
+import resource
+import contextlib
+import numpy as np
+import utilities
+
+pd = utilities.lazy_import("pandas")
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def peak_rss():
+    """Peak resident set size (MB) of this process"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss / 1024**2 if sys.platform == "darwin" else rss / 1024
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class Profiler:
+    """Wall time and peak memory of the phases of a run on every rank
+
+    Phases are timed with the phase() context manager (the time of a
+    phase entered several times is summed) and the peak RSS is sampled
+    at the end of each phase. The report gathers the phases of all ranks
+    and gives the min/max/mean over the ranks that ran each phase. A
+    disabled profiler does nothing.
+    """
+
+    def __init__(self, comm, enabled=True):
+        self.comm = comm
+        self.enabled = enabled
+        self.phases = {}
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = self.phases.setdefault(name, {"calls": 0, "time": 0.0})
+            entry["calls"] += 1
+            entry["time"] += elapsed
+            entry["rss"] = peak_rss()
+
+    def report(self, root=0):
+        """Phase statistics over the ranks (a DataFrame on root, None elsewhere)"""
+        total = {"calls": 1, "time": time.perf_counter() - self.start}
+        total["rss"] = peak_rss()
+        lst = self.comm.gather(dict(self.phases, total=total), root=root)
+        if self.comm.Get_rank() != root:
+            return None
+
+        names = list(dict.fromkeys(name for phases in lst for name in phases))
+        rows = []
+        for name in names:
+            entries = [phases[name] for phases in lst if name in phases]
+            t = np.array([e["time"] for e in entries])
+            rss = np.array([e["rss"] for e in entries])
+            rows.append(
+                {
+                    "phase": name,
+                    "nranks": len(entries),
+                    "calls": max(e["calls"] for e in entries),
+                    "time_min": t.min(),
+                    "time_max": t.max(),
+                    "time_mean": t.mean(),
+                    "imbalance": t.max() / t.mean() if t.mean() > 0 else 1.0,
+                    "rss_min": rss.min(),
+                    "rss_max": rss.max(),
+                    "rss_mean": rss.mean(),
+                }
+            )
+        return pd.DataFrame(rows)
+
+    def write(self, base, root=0):
+        """Write the report to base.dat (csv) and base.json (collective)"""
+        if not self.enabled:
+            return
+
+        df = self.report(root=root)
+        if df is None:
+            return
+
+        df.to_csv(base + ".dat", index=False)
+        with open(base + ".json", "w") as f:
+            json.dump(
+                {"nranks": self.comm.Get_size(), "phases": df.to_dict("records")},
+                f,
+                indent=2,
+            )
@@ -0,0 +1,76 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import os
+import json
+import hashlib
+import datafiles
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def fingerprint(fnames):
+    """Cheap fingerprint of files (name, size, modification time)"""
+    res = []
+    for fname in sorted(fnames):
+        st = os.stat(fname)
+        res.append([os.path.basename(fname), st.st_size, st.st_mtime_ns])
+    return res
+
+
+# ========================================================================
+def content_hash(fnames):
+    """Hash of the contents of the files"""
+    sha = hashlib.sha1()
+    for fname in sorted(fnames):
+        sha.update(os.path.basename(fname).encode())
+        with open(fname, "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+# ========================================================================
+def cached_table(name, fnames, reader, cache_dir):
+    """Table returned by reader(), cached in binary form
+
+    The cache is keyed on the modification times of the source files
+    and, when these change (e.g., a fresh checkout), on the hash of
+    their contents, so it is rebuilt automatically when the files
+    change. The cache is skipped if it cannot be written.
+    """
+    base = os.path.join(cache_dir, name)
+    manifest = base + ".json"
+    files = fingerprint(fnames)
+
+    digest = None
+    if os.path.exists(manifest) and datafiles.table_exists(base):
+        with open(manifest, "r") as f:
+            meta = json.load(f)
+        if meta["files"] == files:
+            return datafiles.read_table(base)
+
+        digest = content_hash(fnames)
+        if meta["hash"] == digest:
+            write_manifest(manifest, files, digest)
+            return datafiles.read_table(base)
+
+    df = reader()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        datafiles.write_table(df, base, "npy")
+        write_manifest(manifest, files, digest or content_hash(fnames))
+    except OSError as err:
+        print(f"Could not cache {name}: {err}")
+
+    return df
+
+
+# ========================================================================
+def write_manifest(fname, files, digest):
+    with open(fname, "w") as f:
+        json.dump({"files": files, "hash": digest}, f)
@@ -0,0 +1,88 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import os
+import re
+import glob
+
+
+# ========================================================================
+#
+# Some defaults variables
+#
+# ========================================================================
+# database written by the solver next to the results (see the input files)
+restart_dirname = "restart"
+restart_extension = ".rst"
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def database(mfile, source="results"):
+    """Name of the database to read for a source
+
+    The restart database of results/name.e is restart/name.rst.
+    """
+    if source == "results":
+        return mfile
+    case = os.path.dirname(os.path.dirname(os.path.abspath(mfile)))
+    base = os.path.splitext(os.path.basename(mfile))[0]
+    return os.path.join(case, restart_dirname, base + restart_extension)
+
+
+# ========================================================================
+def decomposed_files(fname):
+    """Pre-decomposed files (fname.N.r) of a database, in rank order"""
+    pattern = re.compile(re.escape(fname) + r"\.(\d+)\.(\d+)$")
+    files = {}
+    for name in glob.glob(glob.escape(fname) + ".*.*"):
+        match = pattern.match(name)
+        if match is not None:
+            files.setdefault(int(match.group(1)), []).append(name)
+    if not files:
+        return []
+
+    # keep the most complete decomposition if there are several
+    nfiles, names = max(files.items(), key=lambda x: len(x[1]))
+    if len(names) != nfiles:
+        raise RuntimeError(
+            f"Missing files in the {nfiles} file decomposition of {fname}"
+        )
+    return sorted(names)
+
+
+# ========================================================================
+def decomposition(fname, size, auto_decomp=False):
+    """Database file to read on size ranks and whether to auto decompose it
+
+    Pre-decomposed files are read one to one (without a serial read and
+    redistribution) when there is one file per rank, unless auto_decomp
+    asks to decompose the joined database. A single decomposed file is
+    read as is on one rank.
+    """
+    files = decomposed_files(fname)
+    nfiles = len(files)
+    if os.path.exists(fname) and (auto_decomp or size == 1 or nfiles != size):
+        return fname, auto_decomp or size > 1
+    if nfiles == size:
+        return (files[0] if size == 1 else fname), False
+    if nfiles == 0:
+        raise FileNotFoundError(f"Could not find {fname}")
+    raise RuntimeError(
+        f"{fname} is decomposed in {nfiles} file(s): run on as many ranks"
+        f" or join the files (e.g., with epu)"
+    )
+
+
+# ========================================================================
+def missing_fields(fields, names):
+    """Names of the fields that are not in the database
+
+    The names are the requested ones: a null field has no name.
+    """
+    return [name for fld, name in zip(fields, names) if fld.is_null]
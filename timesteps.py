@@ -0,0 +1,122 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+
+
+# ========================================================================
+#
+# Some defaults variables
+#
+# ========================================================================
+strategies = ["flowthrough", "last", "range", "converge"]
+
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def unique_steps(tsteps, rtol=1e-10):
+    """Indices of the unique time steps (sorted) and of the duplicates
+
+    The first of the steps with the same time (e.g., a time written
+    again after a restart) is kept.
+    """
+    tsteps = np.asarray(tsteps, dtype=np.float64)
+    order = np.argsort(tsteps, kind="stable")
+    ts = tsteps[order]
+    dup = np.zeros(len(ts), dtype=bool)
+    dup[1:] = np.diff(ts) <= rtol * np.maximum(np.abs(ts[1:]), 1.0)
+    return order[~dup], order[dup]
+
+
+# ========================================================================
+def nearest(times, targets):
+    """Index of the nearest of the sorted times to each target
+
+    The earlier time is picked on ties.
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    if len(times) == 1:
+        return np.zeros(targets.shape, dtype=np.int64)
+    idx = np.clip(np.searchsorted(times, targets), 1, len(times) - 1)
+    return np.where(targets - times[idx - 1] <= times[idx] - targets, idx - 1, idx)
+
+
+# ========================================================================
+def select(
+    tsteps,
+    strategy="flowthrough",
+    navg=10,
+    spacing=None,
+    start=None,
+    end=None,
+    rtol=1e-10,
+):
+    """Time window to average over
+
+    The duplicate steps are dropped and the steps are restricted to
+    [start, end] with binary searches. The strategies then pick:
+
+    - flowthrough: the navg steps nearest to the last time minus
+      multiples of spacing (a step can be picked several times)
+    - last: the last navg steps
+    - range: every step
+    - converge: every step, read from the last one backwards so that the
+      reading can stop once the averages have converged
+    """
+    tsteps = np.asarray(tsteps, dtype=np.float64)
+    keep, dup = unique_steps(tsteps, rtol)
+    times = tsteps[keep]
+    lo = 0 if start is None else np.searchsorted(times, start, side="left")
+    hi = len(times) if end is None else np.searchsorted(times, end, side="right")
+    times = times[lo:hi]
+    if len(times) == 0:
+        raise ValueError(f"No time steps in [{start}, {end}]")
+
+    if strategy == "flowthrough":
+        targets = np.sort(times[-1] - spacing * np.arange(navg))
+        idx = nearest(times, targets)
+    elif strategy == "last":
+        idx = np.arange(max(len(times) - navg, 0), len(times))
+    elif strategy in ("range", "converge"):
+        idx = np.arange(len(times))
+    else:
+        raise ValueError(f"Unknown window strategy: {strategy}")
+
+    counts = np.bincount(idx - idx[0], minlength=len(times) - idx[0])
+    return Window(times[idx[0] :], counts, np.sort(tsteps[dup]), strategy)
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class Window:
+    """Time steps to read and the number of times each is averaged
+
+    Every step between the first and last selected steps is read (for
+    the instantaneous statistics) while the field averages weigh each
+    step by the number of times it was selected. The steps are in
+    reading order (latest first for the converge strategy).
+    """
+
+    def __init__(self, times, counts, duplicates, strategy):
+        self.strategy = strategy
+        self.reverse = strategy == "converge"
+        step = -1 if self.reverse else 1
+        self.times = np.asarray(times)[::step]
+        self.counts = np.asarray(counts)[::step]
+        self.duplicates = duplicates
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def averaged(self):
+        """Selected times (in time order, repeated if selected several times)"""
+        return np.sort(np.repeat(self.times, self.counts))